@@ -4,12 +4,23 @@ Enhanced Medical Report Summarizer - Web UI
 Modern, accessible, and user-friendly interface using Streamlit.
 """
 
+import os
 import re
+import sys
+import uuid
 from datetime import datetime
 from typing import List, Tuple
 
 import streamlit as st
 
+# Pipeline modules import each other as siblings of src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from history_store import SHARED_HISTORY, HistoryStore  # noqa: E402
+
+# Version of the summarizers below, part of every history key: bump it when
+# comprehensive_summarize or patient_friendly_summary change what they return
+HISTORY_VERSION = "1"
+
 # Page config
 st.set_page_config(
     page_title="Medical Report Summarizer (Enhanced)",
@@ -48,15 +59,32 @@ if "prefs" not in st.session_state:
         "save_history": True,
         "auto_analyze": False,
     }
-if "history" not in st.session_state:
-    st.session_state.history = []
 
 # Core logic
 
+@st.cache_resource
+def get_history_store() -> HistoryStore:
+    """Persistent history store (SQLite) used by all sessions; entries are scoped by history_owner()."""
+    return HistoryStore(version=HISTORY_VERSION)
+
+def history_owner() -> str:
+    """Owner of this session's history entries, or "" when ANALYSIS_HISTORY_SHARED=1."""
+    if SHARED_HISTORY:
+        return ""
+    if "history_owner" not in st.session_state:
+        st.session_state["history_owner"] = uuid.uuid4().hex
+    return st.session_state["history_owner"]
+
 def _set_report_text(value: str = "") -> None:
     """Helper to set report_text in session_state before text area renders."""
     st.session_state["report_text"] = value
 
+def _open_history_entry(text_hash: str) -> None:
+    """Load a past report into the editor; re-analyzing it is a history lookup."""
+    entry = get_history_store().entry(text_hash, "enhanced_web_ui", history_owner())
+    if entry:
+        _set_report_text(entry["report_text"])
+
 def comprehensive_summarize(text: str) -> Tuple[List[str], List[str]]:
     text_lower = text.lower()
     # Keep only specific, clinically meaningful terms to reduce false matches
@@ -191,17 +219,22 @@ def analyze_and_render(report_text: str) -> None:
     if not ok:
         st.error(msg)
         return
-    with st.spinner("Analyzing report..."):
-        pos, neg = comprehensive_summarize(report_text)
-        pos_h, neg_h = patient_friendly_summary(pos, neg)
-    if st.session_state.prefs["save_history"]:
-        st.session_state.history.append({
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "preview": (report_text[:100] + "...") if len(report_text) > 100 else report_text,
-            "pos": pos,
-            "neg": neg,
-        })
-        st.session_state.history = st.session_state.history[-10:]
+    store = get_history_store()
+    cached = store.get(report_text, "enhanced_web_ui", history_owner())
+    if cached:
+        pos, neg, pos_h, neg_h = cached["pos"], cached["neg"], cached["pos_h"], cached["neg_h"]
+    else:
+        with st.spinner("Analyzing report..."):
+            pos, neg = comprehensive_summarize(report_text)
+            pos_h, neg_h = patient_friendly_summary(pos, neg)
+        if st.session_state.prefs["save_history"]:
+            store.save(
+                report_text,
+                {"pos": pos, "neg": neg, "pos_h": pos_h, "neg_h": neg_h},
+                names=pos + [x[3:] if x.startswith("no ") else x for x in neg],
+                source="enhanced_web_ui",
+                owner=history_owner(),
+            )
 
     st.markdown("---")
     st.markdown('<div class="sub-header">📊 Analysis Results</div>', unsafe_allow_html=True)
@@ -269,13 +302,24 @@ def main():
             "Paste your report, click Analyze. Works for radiology, labs, notes."
         )
 
-        if st.session_state.history:
+        store = get_history_store()
+        recent = store.recent(5, source="enhanced_web_ui", owner=history_owner())
+        if recent:
             st.subheader("Recent analyses")
-            for item in reversed(st.session_state.history[-5:]):
-                with st.expander(item["time"]):
-                    st.write("Preview:", item["preview"]) 
-                    if item["pos"]:
-                        st.write("Findings:", ", ".join(item["pos"]))
+            query = st.text_input("Search by finding", key="history_query")
+            items = store.search(query, source="enhanced_web_ui", limit=5, owner=history_owner()) if query.strip() else recent
+            for item in items:
+                with st.expander(datetime.fromtimestamp(item["created_at"]).strftime("%Y-%m-%d %H:%M:%S")):
+                    st.write("Preview:", item["preview"])
+                    results = store.load(item["text_hash"], "enhanced_web_ui", history_owner()) or {}
+                    if results.get("pos"):
+                        st.write("Findings:", ", ".join(results["pos"]))
+                    st.button(
+                        "Open",
+                        key=f"open_{item['text_hash']}",
+                        on_click=_open_history_entry,
+                        args=(item["text_hash"],),
+                    )
 
     col1, col2 = st.columns([2, 1])
 
@@ -0,0 +1,159 @@
+"""CPU training-throughput benchmark for batching strategies.
+
+    python scripts/bench_batching.py --config configs/config.yaml --steps 20 --examples 64
+
+Strategies:
+  max_length  every example padded to max_input_length / max_target_length
+              (what src/train.py used to do)
+  dynamic     tokenized without padding, padded per batch by DataCollatorForSeq2Seq
+  group_by_length
+              dynamic padding, batches in the order of the Trainer's
+              LengthGroupedSampler (what train.py's length_bucketing turns on)
+
+Each strategy runs the same number of optimizer steps from the same initial
+weights on the train split (repeated up to --examples). Reports steps/sec,
+real (non-pad) input tokens/sec and the padding ratio of inputs and labels.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import torch  # noqa: E402
+from datasets import load_dataset  # noqa: E402
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, DataCollatorForSeq2Seq  # noqa: E402
+from transformers.trainer_pt_utils import LengthGroupedSampler  # noqa: E402
+
+from train import data_files, load_config, pick_columns  # noqa: E402
+
+
+def load_pairs(cfg: dict, n: int, seed: int) -> list:
+    train = load_dataset("json", data_files={"train": data_files(cfg)["train"]})["train"]
+    src, tgt = pick_columns(train.column_names)
+    pairs = list(zip(train[src], train[tgt]))
+    pairs = [pairs[i % len(pairs)] for i in range(max(n, len(pairs)))]
+    random.Random(seed).shuffle(pairs)
+    return pairs
+
+
+def tokenize(tokenizer, pairs: list, cfg: dict, pad_to_max: bool) -> list:
+    max_input = cfg.get("max_input_length", 512)
+    max_target = cfg.get("max_target_length", 128)
+    padding = "max_length" if pad_to_max else False
+    enc = tokenizer([s for s, _ in pairs], max_length=max_input, truncation=True, padding=padding)
+    lab = tokenizer(text_target=[t for _, t in pairs], max_length=max_target, truncation=True, padding=padding)
+    feats = []
+    for i in range(len(pairs)):
+        labels = lab["input_ids"][i]
+        if pad_to_max:
+            labels = [tok if m else -100 for tok, m in zip(labels, lab["attention_mask"][i])]
+        feats.append({"input_ids": enc["input_ids"][i], "attention_mask": enc["attention_mask"][i], "labels": labels})
+    return feats
+
+
+def random_batches(n: int, batch_size: int, seed: int) -> list:
+    order = list(range(n))
+    random.Random(seed).shuffle(order)
+    return [order[i:i + batch_size] for i in range(0, n, batch_size)]
+
+
+def length_batches(feats: list, args) -> list:
+    """Batches as the Trainer builds them with group_by_length: a LengthGroupedSampler over
+    megabatches of batch_size * gradient_accumulation_steps, cut into batch_size batches."""
+    lengths = [len(f["input_ids"]) for f in feats]
+    generator = torch.Generator().manual_seed(args.seed)
+    order = list(LengthGroupedSampler(args.batch_size * args.grad_accum, lengths=lengths, generator=generator))
+    return [order[i:i + args.batch_size] for i in range(0, len(order), args.batch_size)]
+
+
+# name -> (pad every example to the max lengths?, batch builder(features, args))
+STRATEGIES = {
+    'max_length': (True, lambda feats, args: random_batches(len(feats), args.batch_size, args.seed)),
+    'dynamic': (False, lambda feats, args: random_batches(len(feats), args.batch_size, args.seed)),
+    'group_by_length': (False, length_batches),
+}
+
+
+def run(strategy: str, model, init_state: dict, tokenizer, pairs: list, cfg: dict, args) -> dict:
+    pad_to_max, make_batches = STRATEGIES[strategy]
+    feats = tokenize(tokenizer, pairs, cfg, pad_to_max)
+    batches = make_batches(feats, args)
+    collator = DataCollatorForSeq2Seq(tokenizer, model=model, label_pad_token_id=-100)
+    model.load_state_dict(init_state)
+    model.train()
+    optimizer = torch.optim.AdamW(model.parameters(), lr=5e-5)
+
+    def step(i):
+        batch = collator([feats[j] for j in batches[i % len(batches)]])
+        loss = model(**batch).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+        return batch
+
+    step(0)  # warm-up (allocations, kernel selection)
+    real_in = total_in = real_lab = total_lab = 0
+    start = time.perf_counter()
+    for i in range(1, args.steps + 1):
+        batch = step(i)
+        real_in += int(batch["attention_mask"].sum())
+        total_in += batch["attention_mask"].numel()
+        real_lab += int((batch["labels"] != -100).sum())
+        total_lab += batch["labels"].numel()
+    elapsed = time.perf_counter() - start
+    return {
+        'strategy': strategy,
+        'steps_per_sec': round(args.steps / elapsed, 3),
+        'input_tokens_per_sec': round(real_in / elapsed, 1),
+        'input_padding_ratio': round(1 - real_in / total_in, 3) if total_in else 0.0,
+        'label_padding_ratio': round(1 - real_lab / total_lab, 3) if total_lab else 0.0,
+        'seconds': round(elapsed, 2),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--config", default=os.path.join(ROOT, "configs", "config.yaml"))
+    ap.add_argument("--strategies", nargs="*", default=list(STRATEGIES), choices=list(STRATEGIES))
+    ap.add_argument("--steps", type=int, default=20)
+    ap.add_argument("--examples", type=int, default=64)
+    ap.add_argument("--batch-size", type=int, default=None, help="default: train.per_device_train_batch_size")
+    ap.add_argument("--grad-accum", type=int, default=None, help="default: train.gradient_accumulation_steps")
+    ap.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="write the results as JSON")
+    args = ap.parse_args(argv)
+
+    cfg = load_config(args.config)
+    args.batch_size = args.batch_size or cfg.get("train", {}).get("per_device_train_batch_size", 8)
+    args.grad_accum = args.grad_accum or cfg.get("train", {}).get("gradient_accumulation_steps", 1)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    model_name = cfg.get("base_model", "google/flan-t5-small")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    init_state = {k: v.clone() for k, v in model.state_dict().items()}
+    pairs = load_pairs(cfg, args.examples, args.seed)
+
+    rows = [run(s, model, init_state, tokenizer, pairs, cfg, args) for s in args.strategies]
+    print(f"{model_name}, batch {args.batch_size} (x{args.grad_accum} accumulation), {args.steps} steps, {len(pairs)} examples, {torch.get_num_threads()} threads")
+    print(f"{'strategy':<16}{'steps/s':>9}{'tokens/s':>11}{'input pad':>11}{'label pad':>11}")
+    for r in rows:
+        print(f"{r['strategy']:<16}{r['steps_per_sec']:>9.2f}{r['input_tokens_per_sec']:>11.0f}"
+              f"{r['input_padding_ratio']:>11.1%}{r['label_padding_ratio']:>11.1%}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'model': model_name, 'batch_size': args.batch_size,
+                       'gradient_accumulation_steps': args.grad_accum, 'steps': args.steps, 'results': rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Doctor + patient summaries: one shared encoder pass vs two full generations.
+
+    python scripts/bench_dual.py --config configs/config.yaml [--model-dir results] [--limit 64]
+
+Both ways decode the same two task prompts (generation.TASK_PREFIXES) with
+the doc_target_max_len / patient_target_max_len budgets from the config:
+  separate  one generate() per task, so the encoder runs twice per report
+  shared    encoder once per batch, both tasks decode from its output
+Reports examples/sec, the time spent in the encoder, and how many outputs
+are identical between the two (greedy decoding should make them equal).
+Use a checkpoint trained on doctor/patient targets for meaningful text;
+the timings hold for any seq2seq checkpoint.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import torch  # noqa: E402
+
+from evaluate import test_file, tokenized_test_set  # noqa: E402
+from generation import generate_dual_from_ids, generate_separately_from_ids, load_model  # noqa: E402
+from length_buckets import bucket_batches  # noqa: E402
+from train import load_config  # noqa: E402
+
+
+def encoder_seconds(model, tokenizer, encoded: list, batch_size: int) -> float:
+    """Time of one encoder pass over every batch."""
+    encoder = model.get_encoder()
+    start = time.perf_counter()
+    with torch.inference_mode():
+        for batch in bucket_batches([len(ids) for ids in encoded], batch_size, shuffle=False):
+            enc = tokenizer.pad({"input_ids": [list(encoded[i]) for i in batch]}, return_tensors="pt")
+            encoder(**enc)
+    return time.perf_counter() - start
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--config", default=os.path.join(ROOT, "configs", "config.yaml"))
+    ap.add_argument("--model-dir", help="default: eval.model_dir, then train.output_dir")
+    ap.add_argument("--limit", type=int, default=64)
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--num-beams", type=int, default=1)
+    ap.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    ap.add_argument("--json", help="write the results as JSON")
+    args = ap.parse_args(argv)
+
+    cfg = load_config(args.config)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model_dir = args.model_dir or cfg.get("eval", {}).get("model_dir") or cfg.get("train", {}).get("output_dir", "./results")
+    tokenizer, model = load_model(model_dir, cfg.get("base_model", "google/flan-t5-small"))
+    data = tokenized_test_set(cfg, test_file(cfg), tokenizer)
+    encoded = data.select(range(min(args.limit, len(data))))["input_ids"]
+    budgets = {'doctor': cfg.get("doc_target_max_len", 128), 'patient': cfg.get("patient_target_max_len", 110)}
+    kwargs = {'max_new_tokens': budgets, 'batch_size': args.batch_size, 'num_beams': args.num_beams}
+
+    generate_dual_from_ids(model, tokenizer, encoded[:1], **kwargs)  # warm-up
+    runs = {}
+    for name, fn in (('separate', generate_separately_from_ids), ('shared', generate_dual_from_ids)):
+        start = time.perf_counter()
+        outputs = fn(model, tokenizer, encoded, **kwargs)
+        runs[name] = (time.perf_counter() - start, outputs)
+    enc_s = encoder_seconds(model, tokenizer, encoded, args.batch_size)
+
+    n = len(encoded)
+    same = sum(runs['separate'][1][t][i] == runs['shared'][1][t][i] for t in budgets for i in range(n))
+    rows = [{'mode': name, 'seconds': round(sec, 3), 'examples_per_sec': round(n / sec, 2),
+             'encoder_passes': 2 if name == 'separate' else 1} for name, (sec, _) in runs.items()]
+    result = {
+        'model_dir': model_dir, 'examples': n, 'results': rows,
+        'encoder_s_per_pass': round(enc_s, 3),
+        'speedup': round(runs['separate'][0] / runs['shared'][0], 3),
+        'identical_outputs': f"{same}/{n * len(budgets)}",
+    }
+
+    print(f"{model_dir}, {n} reports, batch {args.batch_size}, beams {args.num_beams}, budgets {budgets}")
+    print(f"{'mode':<10}{'seconds':>9}{'reports/s':>11}{'encoder passes':>16}")
+    for r in rows:
+        print(f"{r['mode']:<10}{r['seconds']:>9.2f}{r['examples_per_sec']:>11.2f}{r['encoder_passes']:>16}")
+    print(f"one encoder pass over the set: {enc_s:.2f}s; shared is x{result['speedup']} faster; "
+          f"identical outputs {result['identical_outputs']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
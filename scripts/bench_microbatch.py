@@ -0,0 +1,114 @@
+"""Throughput vs latency of micro-batched generation on CPU.
+
+    python scripts/bench_microbatch.py --model-dir results --concurrency 16 --requests 128 \\
+        --max-batch 1 4 8 16 --max-wait-ms 2 5 10
+
+Loads the model once, then for every (max_batch, max_wait_ms) pair runs a
+closed loop of --concurrency clients, each submitting one report at a time
+to a MicroBatcher until --requests are done. max_batch 1 is the unbatched
+baseline (wait is ignored). Reports requests/sec, p50/p95/p99 latency and
+the mean batch size actually formed. Reports come from --corpus (default
+data/*.jsonl), cycled as needed.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+from load_test import load_reports, percentile  # noqa: E402
+from microbatch import MicroBatcher  # noqa: E402
+
+
+def run_config(fn, reports: list, max_batch: int, max_wait_ms: float, concurrency: int, n_requests: int) -> dict:
+    batcher = MicroBatcher(fn, max_batch, max_wait_ms if max_batch > 1 else 0.0).start()
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(n_requests))
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            t0 = time.perf_counter()
+            batcher.submit(reports[i % len(reports)]).result()
+            with lock:
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stats = batcher.stats()
+    batcher.shutdown()
+    latencies.sort()
+    return {
+        'max_batch': max_batch,
+        'max_wait_ms': max_wait_ms if max_batch > 1 else 0.0,
+        'requests_per_sec': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50), 1),
+        'p95_ms': round(percentile(latencies, 0.95), 1),
+        'p99_ms': round(percentile(latencies, 0.99), 1),
+        'mean_batch': stats['mean_batch'],
+        'mean_queue_wait_ms': stats['mean_queue_wait_ms'],
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--model-dir", default=os.environ.get("MODEL_DIR", "results"))
+    ap.add_argument("--corpus", nargs="*", default=[os.path.join(ROOT, "data", "*.jsonl")], help="files or globs")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=128)
+    ap.add_argument("--max-batch", type=int, nargs="+", default=[1, 4, 8, 16])
+    ap.add_argument("--max-wait-ms", type=float, nargs="+", default=[2.0, 5.0, 10.0])
+    ap.add_argument("--max-new-tokens", type=int, default=64)
+    ap.add_argument("--quantize", action="store_true", help="dynamic int8 Linear layers")
+    ap.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    ap.add_argument("--json", help="write the results as JSON")
+    args = ap.parse_args(argv)
+
+    reports = [r for pattern in args.corpus for path in sorted(glob.glob(pattern)) for r in load_reports(path)]
+    if not reports:
+        print("No reports found.", file=sys.stderr)
+        return 1
+
+    import torch
+    from generation import batch_generator, load_model
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tokenizer, model = load_model(args.model_dir, quantize=args.quantize)
+    fn = batch_generator(model, tokenizer, max_new_tokens=args.max_new_tokens)
+    fn(reports[:1])  # warm-up
+
+    grid = []
+    for max_batch in args.max_batch:
+        for wait in (args.max_wait_ms if max_batch > 1 else [0.0]):
+            grid.append((max_batch, wait))
+    rows = [run_config(fn, reports, b, w, args.concurrency, args.requests) for b, w in grid]
+
+    print(f"{args.model_dir}, {args.concurrency} clients, {args.requests} requests, {torch.get_num_threads()} threads")
+    print(f"{'batch':>6}{'wait ms':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'mean batch':>12}")
+    for r in rows:
+        print(f"{r['max_batch']:>6}{r['max_wait_ms']:>9.1f}{r['requests_per_sec']:>9.2f}{r['p50_ms']:>9.1f}"
+              f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['mean_batch']:>12.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'model_dir': args.model_dir, 'concurrency': args.concurrency, 'results': rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
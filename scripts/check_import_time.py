@@ -0,0 +1,110 @@
+"""Import-time budget check for CLI entry points and light modules.
+
+    python scripts/check_import_time.py [--budget-ms 150] [--repeat 3]
+
+Imports each module in a fresh interpreter with `python -X importtime` and
+reads its cumulative import time (best of --repeat runs, interpreter
+start-up excluded). Fails (exit 1) when a module cannot be imported,
+exceeds the budget or pulls in a heavy dependency (torch, numpy, PIL,
+pytesseract, pandas, ...) at import time; those must be imported inside the
+functions that need them. tests/test_import_time.py runs the same check.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+# (module, directory it is imported from)
+TARGETS = [
+    ("quick_summarize", ROOT),
+    ("summarize_my_report", ROOT),
+    ("accurate_summarizer", ROOT),
+    ("comprehensive_summarizer", ROOT),
+    ("enhanced_summarizer", ROOT),
+    ("final_summarizer", ROOT),
+    ("utils", SRC),
+    ("preprocess", SRC),
+    ("lab_pipeline", SRC),
+    ("findings", SRC),
+    ("ocr", SRC),
+    ("batch", SRC),
+    ("service", SRC),
+    ("history_store", SRC),
+    ("session_store", SRC),
+    ("length_buckets", SRC),
+]
+HEAVY = ("torch", "transformers", "datasets", "numpy", "PIL", "pytesseract", "pandas", "streamlit", "sklearn")
+
+
+def import_profile(module: str, path: str) -> tuple:
+    """(cumulative ms of `module`, heavy top-level packages it imported)."""
+    code = f"import sys; sys.path.insert(0, {path!r}); import {module}"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, cwd=path)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    cumulative_us = 0
+    heavy = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line.split("|")
+        name = parts[-1].strip()
+        try:
+            cum = int(parts[1].strip())
+        except ValueError:
+            continue  # header line
+        if name == module:
+            cumulative_us = cum
+        top = name.split(".")[0]
+        if top in HEAVY:
+            heavy.add(top)
+    return cumulative_us / 1000.0, sorted(heavy)
+
+
+def check(budget_ms: float, repeat: int = 3, modules=()) -> list:
+    """One result per target: module, ms (None if the import failed), heavy, error and ok."""
+    results = []
+    for module, path in TARGETS:
+        if modules and module not in modules:
+            continue
+        try:
+            runs = [import_profile(module, path) for _ in range(max(1, repeat))]
+        except RuntimeError as e:
+            results.append({'module': module, 'ms': None, 'heavy': [], 'error': str(e), 'ok': False})
+            continue
+        ms = min(r[0] for r in runs)
+        heavy = runs[0][1]
+        results.append({'module': module, 'ms': ms, 'heavy': heavy, 'error': None,
+                        'ok': ms <= budget_ms and not heavy})
+    return results
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", "150")))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("modules", nargs="*", help="only check these modules")
+    args = ap.parse_args(argv)
+    unknown = sorted(set(args.modules) - {m for m, _ in TARGETS})
+    if unknown:
+        ap.error(f"not in TARGETS: {', '.join(unknown)}")
+
+    results = check(args.budget_ms, args.repeat, args.modules)
+    print(f"{'module':<26}{'import ms':>10}  heavy imports")
+    for r in results:
+        if r['error']:
+            print(f"{r['module']:<26}{'-':>10}  IMPORT FAILED ({r['error']})")
+            continue
+        flag = "  OVER BUDGET" if r['ms'] > args.budget_ms else ""
+        print(f"{r['module']:<26}{r['ms']:>10.1f}  {', '.join(r['heavy']) or '-'}{flag}")
+    print(f"budget: {args.budget_ms:.0f} ms per module; heavy modules must be imported lazily")
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Compare CPU inference backends of the fine-tuned summarizer.
+
+    python scripts/compare_backends.py --config configs/config.yaml [--variants fp32 int8 onnx] [--limit 200]
+
+Variants:
+  fp32  PyTorch eager
+  int8  PyTorch with dynamic int8 Linear layers (generation.quantize_int8)
+  onnx  ONNX Runtime CPU provider on --onnx-dir (scripts/export_onnx.py)
+
+Each variant runs in its own interpreter so memory figures do not overlap:
+  load_s          checkpoint load (+ quantization) time
+  rss_mb          resident memory after loading
+  peak_rss_mb     peak resident memory over the whole run
+  weights_mb      serialized state_dict size
+  p50/p95 ms      single-report generation latency (batch 1)
+  examples/s      batched, length-sorted generation throughput (eval.batch_size)
+  ROUGE           on the evaluation split (paths.test_file), --limit examples
+A checkpoint trained with task prefixes is decoded with
+generate_dual_from_ids (as src/evaluate.py does); ROUGE is then the doctor
+summary against target, with the patient summary against patient_target
+reported next to it.
+Every other variant is also shown as a change against fp32.
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+sys.path.insert(0, SRC)
+
+VARIANTS = ("fp32", "int8", "onnx")
+ROUGE_KEYS = ("rouge1", "rouge2", "rougeL", "rougeLsum")
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def run_variant(variant: str, args) -> dict:
+    """Measure one variant in this process."""
+    import torch
+    from evaluate import dual_budgets, score, test_file, tokenized_test_set
+    from generation import generate_dual_from_ids, generate_from_ids, load_model, load_rouge, timed_generate, training_settings
+    from onnx_model import load_onnx_model
+    from prefork import memory_kb
+    from train import load_config
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    cfg = load_config(args.config)
+    eval_cfg = cfg.get("eval", {})
+    model_dir = args.model_dir or eval_cfg.get("model_dir") or cfg.get("train", {}).get("output_dir", "./results")
+    prefixes = training_settings(args.onnx_dir if variant == "onnx" else model_dir).get("task_prefixes")
+    if prefixes:
+        decode = generate_dual_from_ids
+        gen = {'max_new_tokens': dual_budgets(cfg), 'prefixes': prefixes, 'num_beams': eval_cfg.get("num_beams", 1)}
+    else:
+        decode = generate_from_ids
+        gen = {'max_new_tokens': eval_cfg.get("max_new_tokens", cfg.get("max_target_length", 128)),
+               'num_beams': eval_cfg.get("num_beams", 1)}
+
+    start = time.perf_counter()
+    if variant == "onnx":
+        tokenizer, model = load_onnx_model(args.onnx_dir, threads=args.threads)
+    else:
+        tokenizer, model = load_model(model_dir, cfg.get("base_model", "google/flan-t5-small"), quantize=(variant == "int8"))
+    load_s = time.perf_counter() - start
+    rss_mb = memory_kb(os.getpid())['rss'] / 1024
+    if variant == "onnx":
+        weights_bytes = sum(os.path.getsize(os.path.join(args.onnx_dir, f)) for f in os.listdir(args.onnx_dir)
+                            if f.endswith((".onnx", ".onnx_data")))
+    else:
+        buf = io.BytesIO()
+        torch.save(model.state_dict(), buf)
+        weights_bytes = buf.tell()
+
+    data = tokenized_test_set(cfg, args.data_file or test_file(cfg), tokenizer)
+    data = data.select(range(min(args.limit, len(data))))
+    ids = data["input_ids"]
+
+    decode(model, tokenizer, ids[:1], batch_size=1, **gen)  # warm-up
+    latencies = []
+    for one in ids[:args.latency_examples]:
+        t0 = time.perf_counter()
+        decode(model, tokenizer, [one], batch_size=1, **gen)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    predictions, per_sec = timed_generate(model, tokenizer, ids, generate=decode,
+                                          batch_size=eval_cfg.get("batch_size", 16), **gen)
+    scores = score(predictions, data, load_rouge())
+    patient = scores.get('patient', {})
+    scores = scores['doctor'] if prefixes else scores
+
+    return {
+        'variant': variant,
+        'model_dir': args.onnx_dir if variant == "onnx" else model_dir,
+        'examples': len(ids),
+        'load_s': round(load_s, 2),
+        'rss_mb': round(rss_mb, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'weights_mb': round(weights_bytes / 1e6, 1),
+        'p50_ms': round(_percentile(latencies, 0.50), 1),
+        'p95_ms': round(_percentile(latencies, 0.95), 1),
+        'examples_per_sec': round(per_sec, 2),
+        'dual': bool(prefixes),
+        'rouge': {k: scores[k] for k in ROUGE_KEYS if k in scores},
+        'patient_rouge': {k: patient[k] for k in ROUGE_KEYS if k in patient},
+    }
+
+
+def _delta(base: dict, other: dict) -> dict:
+    return {
+        'latency_p50': round(other['p50_ms'] / base['p50_ms'], 2) if base['p50_ms'] else None,
+        'throughput': round(other['examples_per_sec'] / base['examples_per_sec'], 2) if base['examples_per_sec'] else None,
+        'rss_mb': round(other['rss_mb'] - base['rss_mb'], 1),
+        'weights_mb': round(other['weights_mb'] - base['weights_mb'], 1),
+        'rouge': {k: round(other['rouge'][k] - base['rouge'][k], 4) for k in base['rouge'] if k in other['rouge']},
+    }
+
+
+def _child(variant: str, argv: list) -> dict:
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--variant", variant] + argv,
+                          capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{variant} run failed:\n{proc.stderr.strip()}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--config", default=os.path.join(ROOT, "configs", "config.yaml"))
+    ap.add_argument("--model-dir", help="default: eval.model_dir, then train.output_dir")
+    ap.add_argument("--onnx-dir", default=os.path.join("results", "onnx"), help="exported model for the onnx variant")
+    ap.add_argument("--variants", nargs="+", default=list(VARIANTS[:2]), choices=VARIANTS)
+    ap.add_argument("--data-file", help="JSONL to evaluate; default: paths.test_file")
+    ap.add_argument("--limit", type=int, default=200, help="evaluation examples")
+    ap.add_argument("--latency-examples", type=int, default=20, help="examples timed one at a time")
+    ap.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    ap.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    ap.add_argument("--json", help="write the results as JSON")
+    args = ap.parse_args(argv)
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args)))
+        return 0
+
+    passthrough = ["--config", args.config, "--limit", str(args.limit), "--latency-examples", str(args.latency_examples),
+                   "--onnx-dir", args.onnx_dir]
+    if args.model_dir:
+        passthrough += ["--model-dir", args.model_dir]
+    if args.data_file:
+        passthrough += ["--data-file", args.data_file]
+    if args.threads:
+        passthrough += ["--threads", str(args.threads)]
+    variants = ["fp32"] + [v for v in args.variants if v != "fp32"]
+    try:
+        rows = [_child(v, passthrough) for v in variants]
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    base = rows[0]
+    deltas = {r['variant']: _delta(base, r) for r in rows[1:]}
+
+    print(f"{base['model_dir']}, {base['examples']} examples"
+          f"{' (dual: ROUGE of the doctor summary; patient ROUGE below)' if base['dual'] else ''}")
+    print(f"{'variant':<8}{'load s':>8}{'RSS MB':>9}{'peak MB':>9}{'weights MB':>12}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'ex/s':>8}  ROUGE-1/2/L")
+    for r in rows:
+        rg = r['rouge']
+        print(f"{r['variant']:<8}{r['load_s']:>8.2f}{r['rss_mb']:>9.0f}{r['peak_rss_mb']:>9.0f}{r['weights_mb']:>12.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['examples_per_sec']:>8.2f}"
+              f"  {rg.get('rouge1', 0):.4f}/{rg.get('rouge2', 0):.4f}/{rg.get('rougeL', 0):.4f}")
+    for r in rows:
+        pr = r['patient_rouge']
+        if pr:
+            print(f"{r['variant']} patient ROUGE-1/2/L: {pr.get('rouge1', 0):.4f}/{pr.get('rouge2', 0):.4f}/{pr.get('rougeL', 0):.4f}")
+    for name, d in deltas.items():
+        rd = d['rouge']
+        print(f"{name} vs fp32: p50 x{d['latency_p50']}, throughput x{d['throughput']}, "
+              f"RSS {d['rss_mb']:+.0f} MB, weights {d['weights_mb']:+.1f} MB, "
+              f"ROUGE-1 {rd.get('rouge1', 0):+.4f}, ROUGE-L {rd.get('rougeL', 0):+.4f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'results': rows, 'vs_fp32': deltas}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
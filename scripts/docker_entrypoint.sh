@@ -0,0 +1,12 @@
+#!/bin/sh
+# Start the image's server; it warms itself up in the serving process
+# (prefork.py before forking, the Streamlit app once per process).
+# Any arguments replace the server command (e.g. a shell or a training run).
+set -e
+if [ "$#" -gt 0 ]; then
+    exec "$@"
+fi
+case "${PROFILE:-ui}" in
+    ui|full) exec streamlit run src/app_streamlit.py --server.port=8501 --server.address=0.0.0.0 ;;
+    *) exec python src/prefork.py --port "${PORT:-8000}" --workers "${WORKERS:-$(nproc)}" ;;
+esac
@@ -0,0 +1,95 @@
+"""Export the fine-tuned summarizer to ONNX and check it against PyTorch.
+
+    python scripts/export_onnx.py --config configs/config.yaml [--out results/onnx] [--examples 32]
+
+Writes encoder, decoder and decoder-with-past graphs plus the tokenizer to
+--out, then runs the parity check on the evaluation split:
+  logits      teacher-forced decoder logits (on the PyTorch summaries) must
+              agree within --atol (max absolute difference)
+  summaries   greedy summaries must match exactly for at least --min-match
+              of the examples (float rounding can flip near-ties)
+Exits 1 when either check fails. Latency and throughput are compared by
+scripts/compare_backends.py.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import torch  # noqa: E402
+
+from evaluate import test_file, tokenized_test_set  # noqa: E402
+from generation import generate_from_ids, load_model  # noqa: E402
+from length_buckets import bucket_batches  # noqa: E402
+from onnx_model import DEFAULT_ONNX_DIR, export, load_onnx_model  # noqa: E402
+from train import load_config  # noqa: E402
+
+
+def max_logit_diff(pt_model, ort_model, tokenizer, encoded: list, summaries: list, batch_size: int) -> float:
+    """Largest |logit difference| with both models fed the same decoder inputs."""
+    worst = 0.0
+    lengths = [len(ids) for ids in encoded]
+    with torch.inference_mode():
+        for batch in bucket_batches(lengths, batch_size, shuffle=False):
+            enc = tokenizer.pad({"input_ids": [list(encoded[i]) for i in batch]}, return_tensors="pt")
+            targets = tokenizer([summaries[i] for i in batch], padding=True, return_tensors="pt")["input_ids"]
+            decoder_input_ids = pt_model.prepare_decoder_input_ids_from_labels(labels=targets)
+            pt_logits = pt_model(**enc, decoder_input_ids=decoder_input_ids).logits
+            ort_logits = ort_model(**enc, decoder_input_ids=decoder_input_ids).logits
+            worst = max(worst, float((pt_logits - torch.as_tensor(ort_logits)).abs().max()))
+    return worst
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--config", default=os.path.join(ROOT, "configs", "config.yaml"))
+    ap.add_argument("--model-dir", help="default: eval.model_dir, then train.output_dir")
+    ap.add_argument("--out", default=DEFAULT_ONNX_DIR)
+    ap.add_argument("--skip-export", action="store_true", help="only run the parity check on --out")
+    ap.add_argument("--examples", type=int, default=32, help="evaluation examples for the parity check")
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--atol", type=float, default=1e-3)
+    ap.add_argument("--min-match", type=float, default=0.95)
+    ap.add_argument("--json", help="write the parity results as JSON")
+    args = ap.parse_args(argv)
+
+    cfg = load_config(args.config)
+    eval_cfg = cfg.get("eval", {})
+    model_dir = args.model_dir or eval_cfg.get("model_dir") or cfg.get("train", {}).get("output_dir", "./results")
+    base_model = cfg.get("base_model", "google/flan-t5-small")
+    if not args.skip_export:
+        export(model_dir, args.out, base_model)
+        print(f"Exported {model_dir} to {args.out}")
+
+    tokenizer, pt_model = load_model(model_dir, base_model)
+    _, ort_model = load_onnx_model(args.out)
+    data = tokenized_test_set(cfg, test_file(cfg), tokenizer)
+    data = data.select(range(min(args.examples, len(data))))
+    encoded = data["input_ids"]
+    gen = {'batch_size': args.batch_size, 'num_beams': 1,
+           'max_new_tokens': eval_cfg.get("max_new_tokens", cfg.get("max_target_length", 128))}
+
+    pt_out = generate_from_ids(pt_model, tokenizer, encoded, **gen)
+    ort_out = generate_from_ids(ort_model, tokenizer, encoded, **gen)
+    match = sum(a == b for a, b in zip(pt_out, ort_out)) / max(1, len(pt_out))
+    diff = max_logit_diff(pt_model, ort_model, tokenizer, encoded, pt_out, args.batch_size)
+
+    ok = diff <= args.atol and match >= args.min_match
+    result = {'onnx_dir': args.out, 'examples': len(encoded), 'max_logit_diff': diff, 'atol': args.atol,
+              'summary_match': round(match, 4), 'min_match': args.min_match, 'ok': ok}
+    print(f"parity on {len(encoded)} examples: max |logit diff| {diff:.2e} (atol {args.atol:g}), "
+          f"identical summaries {match:.1%} (min {args.min_match:.0%}) -> {'OK' if ok else 'FAILED'}")
+    for a, b in [(a, b) for a, b in zip(pt_out, ort_out) if a != b][:3]:
+        print(f"  torch: {a}\n  onnx:  {b}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
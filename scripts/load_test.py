@@ -0,0 +1,357 @@
+"""Replay load test for the report pipeline, in-process or over HTTP.
+
+Replays a corpus of reports and reports throughput and p50/p95/p99 latency:
+
+    # HTTP service (start it with: uvicorn api:app --app-dir src --port 8000)
+    python scripts/load_test.py --target http --endpoint /summarize --concurrency 16 --requests 2000
+
+    # Library, open loop at 200 arrivals/s for 30s, saved for later comparison
+    python scripts/load_test.py --target library --rate 200 --duration 30 \\
+        --corpus data/*.jsonl --synthetic 500 --out runs/v2.json --compare runs/v1.json
+
+Corpus files are .txt (one report per file) or .jsonl, using the first of
+'text', 'findings' + 'impression', or 'title' + 'body' found on each line;
+the default is test_report.txt. --synthetic N adds generated lab panels.
+
+Without --rate the test is closed loop: --concurrency clients send
+back-to-back, --requests in total. With --rate arrivals follow a fixed
+schedule (Poisson or uniform) regardless of how fast responses come back,
+and latency is measured from each request's scheduled time, so queueing
+delay under overload is counted instead of hidden.
+
+Over HTTP every request body is made unique with a letters-only tag line
+(kept by normalize_report_text, matched by no lab rule or finding), so the
+server's result cache and request coalescing cannot answer from memory and
+the run measures the pipeline. --allow-cache replays the bodies as they are;
+either way the result cache hit rate during the run is reported from /stats.
+
+With --image (HTTP only), --image-concurrency clients keep POSTing that
+image to /ocr for the whole run, to check that text latency holds up
+during an OCR burst.
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+
+def _report_from_record(rec: dict) -> str:
+    if rec.get("text"):
+        return rec["text"]
+    if rec.get("findings"):
+        return "\n".join(x for x in (rec.get("findings"), rec.get("impression")) if x)
+    if rec.get("body"):
+        return "\n".join(x for x in (rec.get("title"), rec.get("body")) if x)
+    return ""
+
+
+def load_reports(path: str) -> list:
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [t for t in (_report_from_record(r) for r in rows) if t.strip()]
+    with open(path, encoding="utf-8") as f:
+        return [f.read()]
+
+
+def synthetic_reports(n: int, seed: int = 0) -> list:
+    """Lab panels built from the reference catalog, with some values out of range."""
+    from lab_pipeline import STANDARD_REFS
+    rnd = random.Random(seed)
+    tests = sorted(STANDARD_REFS.items())
+    reports = []
+    for _ in range(n):
+        lines = ["LABORATORY REPORT"]
+        for name, (unit, low, high) in rnd.sample(tests, k=min(len(tests), rnd.randint(4, 14))):
+            span = (high - low) or 1.0
+            value = rnd.uniform(low - 0.3 * span, high + 0.3 * span)
+            value = round(value) if high >= 100 else round(value, 1)
+            lines.append(f"{name.upper()} {value} {unit} {low}-{high}".replace("  ", " "))
+        reports.append("\n".join(lines))
+    return reports
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def post(url: str, body: bytes, timeout: float, content_type: str = "application/json") -> int:
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except Exception:
+        return 0
+
+
+# Tag alphabet: letters only, so the tag line never parses as a lab value
+TAG_LETTERS = "abcdefghijklmnop"
+
+
+def unique_text(text: str) -> str:
+    """text plus a random tag line, so no two requests share a result cache key."""
+    tag = "".join(TAG_LETTERS[b >> 4] + TAG_LETTERS[b & 15] for b in os.urandom(8))
+    return f"{text}\nrequest tag {tag}"
+
+
+def cache_stats(base_url: str, timeout: float) -> dict:
+    """result_cache counters from the service's /stats, or {} if unavailable."""
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + "/stats", timeout=timeout) as resp:
+            return json.load(resp).get('result_cache', {})
+    except Exception:
+        return {}
+
+
+def library_call(op: str, text: str) -> int:
+    """One in-process pipeline run (executed in a worker process)."""
+    import service
+    job = service.summarize_job if op == "/summarize" else service.labs_job
+    try:
+        job(service.normalize_report_text(text))
+        return 200
+    except Exception:
+        return 500
+
+
+def arrival_times(rate: float, duration: float, process: str, seed: int) -> list:
+    rnd = random.Random(seed)
+    times, t = [], 0.0
+    while True:
+        t += rnd.expovariate(rate) if process == "poisson" else 1.0 / rate
+        if t >= duration:
+            return times
+        times.append(t)
+
+
+def git_revision() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip()
+    except Exception:
+        return ""
+
+
+def run_closed(send, n_requests: int, concurrency: int) -> tuple:
+    samples = []
+
+    def one(i):
+        start = time.perf_counter()
+        status = send(i)
+        return status, (time.perf_counter() - start) * 1000.0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(n_requests)))
+    return samples, time.perf_counter() - started
+
+
+def run_open(submit, schedule: list) -> tuple:
+    """Submit request i at schedule[i]; latency counts from the scheduled time."""
+    samples = []
+    lock = threading.Lock()
+    futures = []
+    started = time.perf_counter()
+    for i, at in enumerate(schedule):
+        delay = started + at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        scheduled = started + at
+
+        def done(fut, scheduled=scheduled):
+            try:
+                status = fut.result()
+            except Exception:
+                status = 0
+            with lock:
+                samples.append((status, (time.perf_counter() - scheduled) * 1000.0))
+
+        fut = submit(i)
+        fut.add_done_callback(done)
+        futures.append(fut)
+    for fut in futures:
+        try:
+            fut.result()
+        except Exception:
+            pass
+    # Callbacks may still be running right after result() returns
+    while True:
+        with lock:
+            if len(samples) >= len(futures):
+                break
+        time.sleep(0.001)
+    return samples, time.perf_counter() - started
+
+
+def summarize_run(samples: list, elapsed: float) -> dict:
+    ok = sorted(ms for status, ms in samples if status == 200)
+    throttled = sum(1 for status, _ in samples if status == 429)
+    return {
+        'requests': len(samples),
+        'ok': len(ok),
+        'throttled': throttled,
+        'errors': len(samples) - len(ok) - throttled,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(ok, 0.50), 2),
+            'p95': round(percentile(ok, 0.95), 2),
+            'p99': round(percentile(ok, 0.99), 2),
+            'max': round(ok[-1], 2) if ok else 0.0,
+            'mean': round(sum(ok) / len(ok), 2) if ok else 0.0,
+        },
+    }
+
+
+def print_comparison(current: dict, baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"  vs {baseline_path} ({base.get('revision') or 'unknown revision'}):")
+    pairs = [("throughput_rps", current["throughput_rps"], base["summary"]["throughput_rps"])]
+    pairs += [(q, current["latency_ms"][q], base["summary"]["latency_ms"][q]) for q in ("p50", "p95", "p99")]
+    for name, now, before in pairs:
+        change = f"{100.0 * (now - before) / before:+.1f}%" if before else "n/a"
+        print(f"    {name:>14}: {before:.2f} -> {now:.2f} ({change})")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--target", choices=["http", "library"], default="http")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--endpoint", default="/labs", choices=["/labs", "/summarize"])
+    ap.add_argument("--corpus", nargs="*", default=[], help="report files or globs (.txt/.jsonl)")
+    ap.add_argument("--synthetic", type=int, default=0, help="add N generated lab reports")
+    ap.add_argument("--concurrency", type=int, default=8, help="closed-loop clients")
+    ap.add_argument("--requests", type=int, default=500, help="closed-loop request count")
+    ap.add_argument("--rate", type=float, default=0.0, help="open-loop arrivals per second")
+    ap.add_argument("--duration", type=float, default=30.0, help="open-loop run length (s)")
+    ap.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson")
+    ap.add_argument("--max-outstanding", type=int, default=256, help="open-loop HTTP connections")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="library target processes")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--out", help="write the run as JSON")
+    ap.add_argument("--compare", help="earlier JSON run to compare against")
+    ap.add_argument("--image", help="image to send to /ocr in the background during the run")
+    ap.add_argument("--image-concurrency", type=int, default=4)
+    ap.add_argument("--allow-cache", action="store_true",
+                    help="replay bodies unchanged, letting the result cache answer repeats")
+    args = ap.parse_args(argv)
+
+    paths = [p for pattern in args.corpus for p in sorted(glob.glob(pattern))] if args.corpus else [os.path.join(ROOT, "test_report.txt")]
+    reports = [r for p in paths for r in load_reports(p)] + synthetic_reports(args.synthetic, args.seed)
+    if not reports:
+        print("No reports to replay.", file=sys.stderr)
+        return 1
+    random.Random(args.seed).shuffle(reports)
+    url = args.url.rstrip("/") + args.endpoint
+    bodies = [json.dumps({"text": t}).encode("utf-8") for t in reports]
+
+    def body(i: int) -> bytes:
+        if args.allow_cache:
+            return bodies[i % len(bodies)]
+        return json.dumps({"text": unique_text(reports[i % len(reports)])}).encode("utf-8")
+
+    stop = threading.Event()
+    storm: list = []
+    storm_threads = []
+    if args.image and args.target == "http":
+        with open(args.image, "rb") as f:
+            image = f.read()
+        content_type = "image/png" if args.image.lower().endswith(".png") else "image/jpeg"
+
+        def ocr_client():
+            while not stop.is_set():
+                # Unique trailing bytes (ignored by the decoders) defeat the result cache
+                start = time.perf_counter()
+                status = post(args.url.rstrip("/") + "/ocr", image + os.urandom(16), args.timeout, content_type)
+                storm.append((status, (time.perf_counter() - start) * 1000.0))
+
+        storm_threads = [threading.Thread(target=ocr_client, daemon=True) for _ in range(args.image_concurrency)]
+        for t in storm_threads:
+            t.start()
+
+    if args.target == "library":
+        executor = ProcessPoolExecutor(max_workers=args.workers)
+        submit = lambda i: executor.submit(library_call, args.endpoint, reports[i % len(reports)])
+    else:
+        executor = ThreadPoolExecutor(max_workers=args.max_outstanding)
+        submit = lambda i: executor.submit(post, url, body(i), args.timeout)
+    cache_before = cache_stats(args.url, args.timeout) if args.target == "http" else {}
+
+    with executor:
+        if args.rate > 0:
+            schedule = arrival_times(args.rate, args.duration, args.arrivals, args.seed)
+            samples, elapsed = run_open(submit, schedule)
+            mode = f"open loop, {args.arrivals} arrivals at {args.rate:g}/s for {args.duration:g}s"
+        else:
+            samples, elapsed = run_closed(lambda i: submit(i).result(), args.requests, args.concurrency)
+            mode = f"closed loop, concurrency {args.concurrency}"
+    stop.set()
+    for t in storm_threads:
+        t.join()
+
+    summary = summarize_run(samples, elapsed)
+    cache_after = cache_stats(args.url, args.timeout) if cache_before else {}
+    if cache_after:
+        hits = cache_after['hits'] - cache_before['hits']
+        lookups = hits + cache_after['misses'] - cache_before['misses']
+        summary['result_cache'] = {'hits': hits, 'lookups': lookups,
+                                   'hit_ratio': round(hits / lookups, 4) if lookups else 0.0}
+    where = url if args.target == "http" else f"library ({args.workers} processes)"
+    print(f"{args.endpoint} via {where}: {summary['requests']} requests, {mode}, {elapsed:.2f}s")
+    print(f"  throughput: {summary['throughput_rps']:.1f} req/s  429s: {summary['throttled']}  errors: {summary['errors']}")
+    lat = summary["latency_ms"]
+    print(f"  latency ms: p50 {lat['p50']:.1f}  p95 {lat['p95']:.1f}  p99 {lat['p99']:.1f}  max {lat['max']:.1f}")
+    if 'result_cache' in summary:
+        rc = summary['result_cache']
+        print(f"  result cache: {rc['hits']} hits of {rc['lookups']} lookups ({100.0 * rc['hit_ratio']:.1f}%)"
+              f"{'' if args.allow_cache else ', bodies made unique'}")
+    run = {
+        'revision': git_revision(),
+        'started_at': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - elapsed)),
+        'config': {
+            'target': args.target, 'endpoint': args.endpoint, 'url': args.url if args.target == "http" else None,
+            'mode': 'open' if args.rate > 0 else 'closed', 'rate': args.rate, 'duration': args.duration,
+            'arrivals': args.arrivals, 'concurrency': args.concurrency, 'workers': args.workers,
+            'corpus': paths, 'synthetic': args.synthetic, 'reports': len(reports), 'seed': args.seed,
+            'allow_cache': args.allow_cache,
+        },
+        'summary': summary,
+    }
+    if storm:
+        run['ocr_background'] = summarize_run(storm, elapsed)
+        bg = run['ocr_background']
+        print(f"/ocr background: {bg['requests']} requests, {bg['ok']} ok, {bg['throttled']} rejected with 429, "
+              f"p50 {bg['latency_ms']['p50']:.1f} ms")
+    if args.compare:
+        print_comparison(summary, args.compare)
+    if args.out:
+        if os.path.dirname(args.out):
+            os.makedirs(os.path.dirname(args.out), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"  saved to {args.out}")
+    return 0 if not summary["errors"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Compare worker startup time and memory: pre-fork vs independent processes.
+
+    python scripts/measure_prefork.py --workers 4 [--modules service] [--json out.json]
+
+Three ways of starting N workers that have the pipeline loaded and warm:
+  prefork         warm in the parent, gc.freeze(), fork
+  prefork-nofreeze  same without gc.freeze() (collections in the workers copy shared pages)
+  independent     N fresh interpreters that each import and warm up on their own
+
+Each worker runs a full garbage collection and one more warm-up report
+after starting (as serving would), then RSS, PSS and private memory are
+read from /proc. PSS splits shared pages between the processes sharing
+them, so its sum is the real footprint. Linux only. --modules defaults to
+the pipeline modules; pass "api" to include FastAPI when it is installed.
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+sys.path.insert(0, SRC)
+
+from prefork import freeze, memory_kb, warm  # noqa: E402
+
+CHILD = """
+import gc, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+from prefork import warm
+warm({modules!r})
+sys.stdout.write("ready %.3f\\n" % ((time.perf_counter() - start) * 1000)); sys.stdout.flush()
+gc.collect()
+warm([])
+sys.stdout.write("settled\\n"); sys.stdout.flush()
+sys.stdin.read()
+"""
+
+
+def _fork_workers(n: int, modules: list, use_freeze: bool) -> dict:
+    """Warm once in a helper process, then fork n workers from it."""
+    # Warm up in a fresh child so this script's own imports do not count
+    rd, wr = os.pipe()
+    helper = os.fork()
+    if helper == 0:
+        os.close(rd)
+        start = time.perf_counter()
+        warm(modules)
+        if use_freeze:
+            freeze()
+        warm_ms = (time.perf_counter() - start) * 1000
+        pids, startup = [], []
+        for _ in range(n):
+            c_rd, c_wr = os.pipe()
+            t0 = time.perf_counter()
+            pid = os.fork()
+            if pid == 0:
+                os.close(c_rd)
+                os.write(c_wr, b"r")
+                gc.collect()
+                warm([])
+                os.write(c_wr, b"s")
+                time.sleep(3600)
+                os._exit(0)
+            os.close(c_wr)
+            os.read(c_rd, 1)
+            startup.append((time.perf_counter() - t0) * 1000)
+            os.read(c_rd, 1)
+            os.close(c_rd)
+            pids.append(pid)
+        os.write(wr, json.dumps({'pids': pids, 'startup_ms': startup, 'warm_ms': warm_ms, 'parent': os.getpid()}).encode() + b"\n")
+        time.sleep(3600)
+        os._exit(0)
+    os.close(wr)
+    with os.fdopen(rd) as f:
+        info = json.loads(f.readline())
+    try:
+        mem = [memory_kb(pid) for pid in info['pids']]
+        parent_mem = memory_kb(info['parent'])
+    finally:
+        for pid in info['pids'] + [helper]:
+            try:
+                os.kill(pid, 9)
+            except ProcessLookupError:
+                pass
+        for _ in info['pids']:
+            try:
+                os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+    return {'startup_ms': info['startup_ms'], 'parent_warm_ms': info['warm_ms'], 'workers': mem, 'parent': parent_mem}
+
+
+def _independent_workers(n: int, modules: list) -> dict:
+    procs, startup = [], []
+    code = CHILD.format(src=SRC, modules=modules)
+    for _ in range(n):
+        t0 = time.perf_counter()
+        p = subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        line = p.stdout.readline()
+        if not line.startswith("ready"):
+            raise RuntimeError("worker failed to start")
+        startup.append((time.perf_counter() - t0) * 1000)
+        p.stdout.readline()
+        procs.append(p)
+    try:
+        mem = [memory_kb(p.pid) for p in procs]
+    finally:
+        for p in procs:
+            p.kill()
+            p.wait()
+    return {'startup_ms': startup, 'parent_warm_ms': 0.0, 'workers': mem, 'parent': None}
+
+
+def _row(name: str, res: dict) -> dict:
+    workers = res['workers']
+    n = len(workers)
+    parent_pss = res['parent']['pss'] if res['parent'] else 0
+    return {
+        'mode': name,
+        'workers': n,
+        'startup_ms_avg': round(sum(res['startup_ms']) / n, 1),
+        'parent_warm_ms': round(res['parent_warm_ms'], 1),
+        'rss_kb_avg': sum(w['rss'] for w in workers) // n,
+        'private_kb_avg': sum(w['private'] for w in workers) // n,
+        'pss_kb_total': sum(w['pss'] for w in workers) + parent_pss,
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--modules", nargs="*", default=["service"])
+    ap.add_argument("--json", help="write the results as JSON")
+    args = ap.parse_args(argv)
+    if not hasattr(os, "fork") or not os.path.exists("/proc/self/smaps_rollup"):
+        print("This measurement needs Linux (os.fork and /proc/<pid>/smaps_rollup).", file=sys.stderr)
+        return 1
+
+    rows = [
+        _row("prefork", _fork_workers(args.workers, args.modules, use_freeze=True)),
+        _row("prefork-nofreeze", _fork_workers(args.workers, args.modules, use_freeze=False)),
+        _row("independent", _independent_workers(args.workers, args.modules)),
+    ]
+    header = f"{'mode':<18}{'startup ms':>12}{'parent warm ms':>16}{'RSS kB':>10}{'private kB':>12}{'PSS kB total':>14}"
+    print(header)
+    for r in rows:
+        print(f"{r['mode']:<18}{r['startup_ms_avg']:>12.1f}{r['parent_warm_ms']:>16.1f}{r['rss_kb_avg']:>10}"
+              f"{r['private_kb_avg']:>12}{r['pss_kb_total']:>14}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'modules': args.modules, 'results': rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+#!/usr/bin/env bash
+# Build every Docker profile and report image size and cold start
+# (container start through warm-up of every path, plus the in-container warm-up time).
+set -e
+cd "$(dirname "$0")/.."
+printf "%-7s %10s %14s %14s\n" profile "size MB" "cold start s" "warm-up ms"
+for profile in ${PROFILES:-rules ocr ui full}; do
+    tag="medical-report-summarizer:$profile"
+    docker build -q --build-arg PROFILE="$profile" -t "$tag" . > /dev/null
+    size=$(docker image inspect -f '{{.Size}}' "$tag")
+    start=$(date +%s.%N)
+    out=$(docker run --rm --entrypoint python "$tag" scripts/warmup.py --profile "$profile" --json)
+    end=$(date +%s.%N)
+    warm=$(printf '%s' "$out" | python -c "import json,sys; print(json.load(sys.stdin)['total_ms'])")
+    printf "%-7s %10.0f %14.2f %14s\n" "$profile" "$(echo "$size / 1048576" | bc -l)" "$(echo "$end - $start" | bc -l)" "$warm"
+done
@@ -0,0 +1,81 @@
+"""How much of a corpus the hybrid router keeps away from the model.
+
+    python scripts/routing_stats.py --corpus "data/*.jsonl" [--synthetic 200] [--tokenizer google/flan-t5-small]
+
+Routes every report (router.route_report) and prints lab/header/narrative
+line counts and the fraction of tokens that skipped the model, overall and
+per corpus file. Tokens are whitespace words unless --tokenizer names a
+Hugging Face tokenizer.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+from load_test import load_reports, synthetic_reports  # noqa: E402
+from router import route_report  # noqa: E402
+
+
+def corpus_stats(reports: list, count_tokens) -> dict:
+    stats = {'reports': len(reports), 'lab_lines': 0, 'header_lines': 0, 'narrative_sentences': 0,
+             'tokens_total': 0, 'tokens_to_model': 0, 'rules_only_reports': 0}
+    for text in reports:
+        routed = route_report(text)
+        narrative = " ".join(routed['narrative'])
+        to_model = count_tokens(narrative) if narrative else 0
+        stats['lab_lines'] += len(routed['lab_lines'])
+        stats['header_lines'] += len(routed['header_lines'])
+        stats['narrative_sentences'] += len(routed['narrative'])
+        stats['tokens_to_model'] += to_model
+        stats['tokens_total'] += to_model + sum(count_tokens(ln) for ln in routed['lab_lines'] + routed['header_lines'])
+        stats['rules_only_reports'] += int(not narrative)
+    total = stats['tokens_total']
+    stats['skipped_fraction'] = round(1 - stats['tokens_to_model'] / total, 4) if total else 0.0
+    return stats
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--corpus", nargs="*", default=[os.path.join(ROOT, "test_report.txt")], help="files or globs")
+    ap.add_argument("--synthetic", type=int, default=0, help="add N generated lab panels")
+    ap.add_argument("--tokenizer", help="count model tokens with this tokenizer")
+    ap.add_argument("--json", help="write the results as JSON")
+    args = ap.parse_args(argv)
+
+    count_tokens = lambda s: len(s.split())  # noqa: E731
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tok = AutoTokenizer.from_pretrained(args.tokenizer)
+        count_tokens = lambda s: len(tok(s)["input_ids"])  # noqa: E731
+
+    corpora = {}
+    for pattern in args.corpus:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if os.path.exists(path):
+                corpora[os.path.relpath(path, ROOT)] = load_reports(path)
+    if args.synthetic:
+        corpora['synthetic'] = synthetic_reports(args.synthetic)
+    if not corpora:
+        print("No reports found.", file=sys.stderr)
+        return 1
+
+    rows = {name: corpus_stats(reports, count_tokens) for name, reports in corpora.items()}
+    rows['all'] = corpus_stats([r for reports in corpora.values() for r in reports], count_tokens)
+    print(f"{'corpus':<32}{'reports':>8}{'lab':>7}{'prose':>7}{'tokens':>9}{'to model':>10}{'skipped':>9}")
+    for name, r in rows.items():
+        print(f"{name[-32:]:<32}{r['reports']:>8}{r['lab_lines']:>7}{r['narrative_sentences']:>7}"
+              f"{r['tokens_total']:>9}{r['tokens_to_model']:>10}{r['skipped_fraction']:>9.1%}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
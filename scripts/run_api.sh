@@ -0,0 +1,3 @@
+#!/usr/bin/env bash
+set -e
+uvicorn api:app --app-dir src --host 0.0.0.0 --port "${PORT:-8000}"
@@ -0,0 +1,158 @@
+"""Warm-up check: run the canned report through every path of a profile.
+
+    python scripts/warmup.py --profile ui [--json]
+
+Paths per profile (see Dockerfile):
+  rules  lab parsing + findings (service.warm_up)
+  ocr    rules + OCR of a rendered copy of the canned report
+  ui     ocr + Streamlit import
+  full   ui + ML (torch/transformers import; with MODEL_DIR set, a generation)
+
+This is a diagnostic (scripts/profile_images.sh runs it in each image), not
+a start-up step: warming a separate process does nothing for the server
+that starts after it. The servers warm themselves (prefork.py before
+forking, app_streamlit.py once per process). For each path prints import
+time, the first (cold) call and a second (warm) call. Fails (exit 1) when a path of the profile cannot run, or when a
+non-ML profile ends up importing torch or transformers.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+_START = time.perf_counter()
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+PROFILE_PATHS = {
+    'rules': ['rules'],
+    'ocr': ['rules', 'ocr'],
+    'ui': ['rules', 'ocr', 'ui'],
+    'full': ['rules', 'ocr', 'ui', 'ml'],
+}
+ML_MODULES = ('torch', 'transformers')
+
+
+def _ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000.0, 1)
+
+
+def path_rules() -> dict:
+    start = time.perf_counter()
+    import service
+    import_ms = _ms(start)
+    start = time.perf_counter()
+    first = service.warm_up()
+    first_ms = _ms(start)
+    start = time.perf_counter()
+    service.warm_up()
+    return {'import_ms': import_ms, 'first_ms': first_ms, 'second_ms': _ms(start), 'detail': first}
+
+
+def _report_image() -> bytes:
+    from PIL import Image, ImageDraw
+    import service
+    lines = service.WARMUP_REPORT.splitlines()
+    img = Image.new("L", (900, 24 * len(lines) + 40), 255)
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        draw.text((20, 20 + 24 * i), line, fill=0)
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def path_ocr() -> dict:
+    start = time.perf_counter()
+    import PIL  # noqa: F401
+    import pytesseract  # noqa: F401
+    import service
+    import_ms = _ms(start)
+    data = _report_image()
+    cmd = os.environ.get("TESSERACT_CMD", "")
+    start = time.perf_counter()
+    result = service.ocr_job(data, cmd)
+    first_ms = _ms(start)
+    start = time.perf_counter()
+    service.ocr_job(data, cmd)
+    return {'import_ms': import_ms, 'first_ms': first_ms, 'second_ms': _ms(start),
+            'detail': {'rows': len(result['rows'])}}
+
+
+def path_ui() -> dict:
+    start = time.perf_counter()
+    import streamlit  # noqa: F401
+    import pandas  # noqa: F401
+    return {'import_ms': _ms(start), 'first_ms': 0.0, 'second_ms': 0.0, 'detail': {'streamlit': streamlit.__version__}}
+
+
+def path_ml() -> dict:
+    start = time.perf_counter()
+    import torch  # noqa: F401
+    import transformers
+    import_ms = _ms(start)
+    model_dir = os.environ.get("MODEL_DIR", "")
+    if not model_dir:
+        return {'import_ms': import_ms, 'first_ms': 0.0, 'second_ms': 0.0,
+                'detail': {'transformers': transformers.__version__, 'model': 'MODEL_DIR not set; import only'}}
+    import service
+    start = time.perf_counter()
+    tok = transformers.AutoTokenizer.from_pretrained(model_dir)
+    model = transformers.AutoModelForSeq2SeqLM.from_pretrained(model_dir).eval()
+    load_ms = _ms(start)
+
+    def generate():
+        with torch.inference_mode():
+            enc = tok(service.WARMUP_REPORT, return_tensors="pt", truncation=True, max_length=512)
+            model.generate(**enc, max_new_tokens=32)
+
+    start = time.perf_counter()
+    generate()
+    first_ms = _ms(start)
+    start = time.perf_counter()
+    generate()
+    return {'import_ms': import_ms, 'first_ms': first_ms, 'second_ms': _ms(start),
+            'detail': {'model': model_dir, 'load_ms': load_ms}}
+
+
+PATHS = {'rules': path_rules, 'ocr': path_ocr, 'ui': path_ui, 'ml': path_ml}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--profile", default=os.environ.get("PROFILE", "ui"), choices=sorted(PROFILE_PATHS))
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = ap.parse_args(argv)
+
+    report = {'profile': args.profile, 'paths': {}, 'ok': True}
+    for name in PROFILE_PATHS[args.profile]:
+        try:
+            report['paths'][name] = dict(status='ok', **PATHS[name]())
+        except Exception as e:
+            report['paths'][name] = {'status': f"failed: {type(e).__name__}: {e}"}
+            report['ok'] = False
+        if name != 'ml':
+            leaked = [m for m in ML_MODULES if m in sys.modules]
+            if leaked:
+                report['paths'][name]['status'] = f"failed: imported {', '.join(leaked)}"
+                report['ok'] = False
+    report['total_ms'] = _ms(_START)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"[warmup] profile {args.profile}: {'ok' if report['ok'] else 'FAILED'} in {report['total_ms']:.0f} ms")
+        for name, res in report['paths'].items():
+            if res['status'] == 'ok':
+                print(f"  {name:<6} import {res['import_ms']:>7.1f} ms  first {res['first_ms']:>7.1f} ms  "
+                      f"second {res['second_ms']:>7.1f} ms  {res['detail']}")
+            else:
+                print(f"  {name:<6} {res['status']}")
+    return 0 if report['ok'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Bounded work queues with admission control for the HTTP service.
+
+Each WorkQueue owns its own process pool, so expensive work (OCR) cannot
+take the workers that cheap work (text parsing) needs. Jobs beyond the pool
+size wait in the queue up to max_waiting; past that, new jobs are rejected
+with QueueFull and a Retry-After estimate instead of piling up.
+"""
+
+import asyncio
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+
+class QueueFull(Exception):
+    """A queue is at capacity; retry after retry_after seconds."""
+
+    def __init__(self, queue: str, retry_after: int):
+        super().__init__(f"The {queue} queue is full; retry in {retry_after}s.")
+        self.queue = queue
+        self.retry_after = retry_after
+
+
+class WorkQueue:
+    """Process pool with `workers` running jobs and at most `max_waiting` queued."""
+
+    def __init__(self, name: str, workers: int, max_waiting: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_waiting = max(0, max_waiting)
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        # Moving average of job duration, used for Retry-After
+        self.avg_job_s = 0.0
+
+    def start(self) -> None:
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._slots = asyncio.Semaphore(self.workers)
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def retry_after(self) -> int:
+        """Seconds until roughly one queue slot frees up (at least 1)."""
+        per_job = self.avg_job_s or 1.0
+        return max(1, math.ceil(per_job * (self.waiting + 1) / self.workers))
+
+    async def run(self, fn, *args, block: bool = False):
+        """fn(*args) on this queue's pool.
+
+        Raises QueueFull when max_waiting jobs are already queued, unless
+        block is True (callers that bound their own concurrency, e.g. /batch).
+        """
+        if not block and self.waiting >= self.max_waiting and self.running >= self.workers:
+            self.rejected += 1
+            raise QueueFull(self.name, self.retry_after())
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.avg_job_s = elapsed if not self.avg_job_s else 0.8 * self.avg_job_s + 0.2 * elapsed
+            self.running -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'max_waiting': self.max_waiting,
+            'running': self.running,
+            'waiting': self.waiting,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'avg_job_ms': round(self.avg_job_s * 1000.0, 2),
+        }
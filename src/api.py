@@ -0,0 +1,353 @@
+"""HTTP API for report summarization, lab parsing and OCR.
+
+Run with:  uvicorn api:app --app-dir src --host 0.0.0.0 --port 8000
+
+Endpoints are async; the CPU-bound pipeline (regex parsing, OCR) runs in
+process pools so the event loop only does I/O. OCR and text analysis have
+separate pools and bounded queues, so an image burst cannot starve text
+requests; a full queue answers 429 with Retry-After.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+import metrics
+import service
+from admission import QueueFull, WorkQueue
+from ocr import OCRError
+from result_cache import ResultCache
+from router import NarrativeError
+from singleflight import SingleFlight
+
+API_WORKERS = int(os.environ.get("API_WORKERS", "0")) or max(1, os.cpu_count() or 1)
+API_OCR_WORKERS = int(os.environ.get("API_OCR_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+# Jobs allowed to wait for a worker before new ones are rejected with 429
+API_TEXT_QUEUE = int(os.environ.get("API_TEXT_QUEUE", "64"))
+API_OCR_QUEUE = int(os.environ.get("API_OCR_QUEUE", "8"))
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD", "")
+MAX_TEXT_CHARS = int(os.environ.get("API_MAX_TEXT_CHARS", "200000"))
+MAX_IMAGE_BYTES = int(float(os.environ.get("API_MAX_IMAGE_MB", "15")) * 1024 * 1024)
+# Batch items being computed or waiting to be written to the client
+BATCH_MAX_IN_FLIGHT = int(os.environ.get("API_BATCH_MAX_IN_FLIGHT", "0")) or 2 * API_WORKERS
+RESULT_CACHE_SIZE = int(os.environ.get("API_RESULT_CACHE_SIZE", "1024"))
+
+BATCH_OPS = {'summarize': service.summarize_job, 'labs': service.labs_job, 'hybrid': service.hybrid_job}
+# Ops whose results can be re-read with GET /results/{op}/{digest}
+RESULT_OPS = ('summarize', 'labs', 'hybrid', 'ocr')
+
+
+class ReportIn(BaseModel):
+    text: str
+
+
+text_queue = WorkQueue('text', API_WORKERS, API_TEXT_QUEUE)
+ocr_queue = WorkQueue('ocr', API_OCR_WORKERS, API_OCR_QUEUE)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    service.check_model_settings()
+    try:
+        # Fetch the model server's settings for /hybrid ETags now rather than on the first request
+        await asyncio.to_thread(service.model_tag)
+    except NarrativeError as e:
+        print(f"[api] {e}; fetching its settings again on the first /hybrid request", file=sys.stderr, flush=True)
+    text_queue.start()
+    ocr_queue.start()
+    try:
+        yield
+    finally:
+        text_queue.shutdown()
+        ocr_queue.shutdown()
+
+
+app = FastAPI(title="Medical Report Summarizer API", lifespan=lifespan)
+# Identical reports submitted concurrently (same op and canonical text or image) share one computation
+inflight = SingleFlight()
+results = ResultCache(RESULT_CACHE_SIZE)
+
+metrics.REGISTRY.gauge(
+    "work_queue_running", "Jobs running on each worker pool.",
+    lambda: {(('queue', q.name),): q.running for q in (text_queue, ocr_queue)})
+metrics.REGISTRY.gauge(
+    "work_queue_waiting", "Jobs waiting for a worker in each queue.",
+    lambda: {(('queue', q.name),): q.waiting for q in (text_queue, ocr_queue)})
+metrics.REGISTRY.gauge(
+    "work_queue_rejected_total", "Jobs rejected with 429 because the queue was full.",
+    lambda: {(('queue', q.name),): q.rejected for q in (text_queue, ocr_queue)}, kind="counter")
+metrics.REGISTRY.gauge(
+    "result_cache_lookups_total", "Result cache lookups by outcome.",
+    lambda: {(('result', 'hit'),): results.hits, (('result', 'miss'),): results.misses}, kind="counter")
+metrics.REGISTRY.gauge(
+    "result_cache_hit_ratio", "Share of result cache lookups that were hits.",
+    lambda: {(): results.stats()['hit_ratio']})
+metrics.REGISTRY.gauge(
+    "result_cache_entries", "Results currently cached.",
+    lambda: {(): len(results)})
+metrics.REGISTRY.gauge(
+    "coalesced_requests_total", "Requests that joined an identical in-flight computation.",
+    lambda: {(): inflight.coalesced}, kind="counter")
+
+
+@app.middleware("http")
+async def _observe_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Route template keeps the label set bounded; streaming bodies are timed to first byte
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=route, status=str(response.status_code))
+    return response
+
+
+@app.exception_handler(QueueFull)
+async def _queue_full(request: Request, exc: QueueFull):
+    return JSONResponse(
+        {'detail': str(exc), 'queue': exc.queue},
+        status_code=429,
+        headers={'Retry-After': str(exc.retry_after)},
+    )
+
+
+async def _run_shared(op: str, fn, payload, *args, block: bool = False):
+    """fn(payload, *args) from the result cache, or run on the op's queue coalesced
+    with identical in-flight requests. Raises QueueFull unless block is True."""
+    key = service.request_key(op, payload)
+    cached = results.get(key)
+    if cached is not None:
+        return cached
+    queue = ocr_queue if op == 'ocr' else text_queue
+
+    async def compute():
+        result, spans, counts = await queue.run(service.run_timed, fn, payload, *args, block=block)
+        metrics.record_job(op, spans, counts, result)
+        results.put(key, result)
+        return result
+
+    return await inflight.do(key, compute)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return any((t[2:] if t.startswith("W/") else t) == etag for t in tags)
+
+
+def _result_headers(key: str) -> dict:
+    """ETag of a result, and the GET /results URL that serves it (Content-Location)."""
+    op, digest = key.split(":", 1)
+    return {'ETag': service.result_etag(key), 'Cache-Control': 'private, no-cache',
+            'Content-Location': f"/results/{op}/{digest}"}
+
+
+async def _conditional(request: Request, op: str, fn, payload, *args) -> Response:
+    """JSON result with a strong ETag and a Content-Location to poll it with GET.
+
+    A POST whose If-None-Match matches gets 412 without computing (RFC 9110
+    13.1.2: 304 is only for GET/HEAD); polling clients use GET /results.
+    """
+    key = service.request_key(op, payload)
+    headers = _result_headers(key)
+    if _etag_matches(request.headers.get("if-none-match", ""), headers['ETag']):
+        return Response(status_code=412, headers=headers)
+    result = await _run_shared(op, fn, payload, *args)
+    start = time.perf_counter()
+    response = JSONResponse(result, headers=headers)
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage='render')
+    return response
+
+
+def _report_text(report: ReportIn) -> str:
+    if not report.text.strip():
+        raise HTTPException(status_code=422, detail="Report text is empty.")
+    if len(report.text) > MAX_TEXT_CHARS:
+        raise HTTPException(status_code=413, detail=f"Report text exceeds {MAX_TEXT_CHARS} characters.")
+    return service.normalize_report_text(report.text)
+
+
+@app.get("/health")
+async def health():
+    return {'status': 'ok', 'workers': {'text': API_WORKERS, 'ocr': API_OCR_WORKERS}}
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        'queues': {'text': text_queue.stats(), 'ocr': ocr_queue.stats()},
+        'coalescing': inflight.stats(),
+        'result_cache': results.stats(),
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of latency histograms, counters and gauges."""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/results/{op}/{digest}")
+async def stored_result(op: str, digest: str, request: Request):
+    """A result computed earlier, at the Content-Location its POST returned.
+
+    If-None-Match with its ETag gets 304 whether or not the result is still
+    cached (results are deterministic per input and version); otherwise 404
+    once it has left the result cache, and the report has to be POSTed again.
+    """
+    if op not in RESULT_OPS or len(digest) != 64 or digest.strip("0123456789abcdef"):
+        raise HTTPException(status_code=404, detail="No such result.")
+    key = f"{op}:{digest}"
+    try:
+        headers = _result_headers(key)
+    except NarrativeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if _etag_matches(request.headers.get("if-none-match", ""), headers['ETag']):
+        return Response(status_code=304, headers=headers)
+    result = results.get(key)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Result is no longer cached; POST the report again.")
+    return JSONResponse(result, headers=headers)
+
+
+@app.post("/summarize")
+async def summarize(report: ReportIn, request: Request):
+    """Report text -> technical and patient-friendly findings plus lab rows."""
+    return await _conditional(request, 'summarize', service.summarize_job, _report_text(report))
+
+
+@app.post("/hybrid")
+async def hybrid(report: ReportIn, request: Request):
+    """Report text -> doctor and patient summaries (rules for lab lines, model for prose) plus routing stats."""
+    try:
+        return await _conditional(request, 'hybrid', service.hybrid_job, _report_text(report))
+    except NarrativeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.post("/labs")
+async def labs(report: ReportIn, request: Request):
+    """Report text -> parsed lab rows."""
+    return await _conditional(request, 'labs', service.labs_job, _report_text(report))
+
+
+@app.post("/ocr")
+async def ocr(request: Request):
+    """Raw image bytes (Content-Type image/png or image/jpeg) -> OCR text and lab rows."""
+    data = await request.body()
+    if not data:
+        raise HTTPException(status_code=422, detail="Request body must be the image bytes.")
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image is too large.")
+    try:
+        return await _conditional(request, 'ocr', service.ocr_job, data, TESSERACT_CMD)
+    except OCRError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+class _NDJSONStream(StreamingResponse):
+    """StreamingResponse that never calls receive().
+
+    StreamingResponse normally listens for a client disconnect on receive()
+    while it streams, which swallows request body chunks; /batch is still
+    reading its body then, so the body reader has to own receive() alone.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+
+async def _ndjson_lines(request: Request):
+    """Non-empty lines of the request body, read incrementally."""
+    buf = b""
+    async for chunk in request.stream():
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buf.strip():
+        yield buf
+
+
+async def _batch_item(index: int, line: bytes) -> dict:
+    """Run one batch line; errors are reported in the result, never raised."""
+    out = {'index': index, 'id': None}
+    try:
+        item = json.loads(line)
+        if not isinstance(item, dict):
+            raise ValueError("Each line must be a JSON object.")
+        out['id'] = item.get('id')
+        op = item.get('op', 'summarize')
+        if op not in BATCH_OPS:
+            raise ValueError(f"Unknown op {op!r}; expected one of {sorted(BATCH_OPS)}.")
+        text = _report_text(ReportIn(text=item.get('text') or ''))
+        # Batches bound their own concurrency, so they wait for a worker instead of getting 429s
+        out['result'] = await _run_shared(op, BATCH_OPS[op], text, block=True)
+        out['ok'] = True
+    except HTTPException as e:
+        out.update(ok=False, error=e.detail)
+    except Exception as e:
+        out.update(ok=False, error=str(e) or type(e).__name__)
+    return out
+
+
+@app.post("/batch")
+async def batch(request: Request):
+    """NDJSON in, NDJSON out: one result line per input line, in completion order.
+
+    Input lines are {"id": ..., "text": ..., "op": "summarize" | "labs" | "hybrid"}; each
+    output line carries the input's index and id and either "result" or
+    "error". At most BATCH_MAX_IN_FLIGHT items are computed or waiting to be
+    sent, so the body is read only as fast as the client consumes results.
+    """
+    slots = asyncio.Semaphore(BATCH_MAX_IN_FLIGHT)
+    finished: asyncio.Queue = asyncio.Queue()
+    pending = set()
+
+    async def run(index: int, line: bytes) -> None:
+        await finished.put(await _batch_item(index, line))
+
+    async def produce() -> None:
+        try:
+            index = 0
+            async for line in _ndjson_lines(request):
+                await slots.acquire()
+                task = asyncio.create_task(run(index, line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                index += 1
+        except Exception as e:
+            await finished.put({'index': None, 'id': None, 'ok': False, 'error': f"Could not read batch: {e}"})
+        finally:
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            await finished.put(None)
+
+    # Start reading the body before the response starts; stream() only drains finished
+    producer = asyncio.create_task(produce())
+
+    async def stream():
+        try:
+            while True:
+                out = await finished.get()
+                if out is None:
+                    break
+                yield json.dumps(out) + "\n"
+                if out['index'] is not None:
+                    slots.release()
+        finally:
+            producer.cancel()
+            for task in list(pending):
+                task.cancel()
+
+    return _NDJSONStream(stream(), media_type="application/x-ndjson")
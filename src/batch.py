@@ -0,0 +1,101 @@
+"""Batch processing of many report pages (images or text files).
+
+OCR runs in a thread pool: pytesseract shells out to the tesseract binary, so
+pages are recognised in parallel while the GIL is released.
+"""
+
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from lab_pipeline import analyze_lab_text
+from ocr import OCRError, extract_text_smart
+
+TEXT_EXTENSIONS = (".txt", ".text")
+
+
+def default_workers() -> int:
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def process_page(name: str, data: bytes, tesseract_cmd: str = "") -> dict:
+    """OCR (or decode) one uploaded file and parse its lab rows.
+
+    Returns {'file', 'text', 'rows', 'error'}; errors are reported per file
+    instead of aborting the batch.
+    """
+    result = {'file': name, 'text': '', 'rows': [], 'error': ''}
+    try:
+        if name.lower().endswith(TEXT_EXTENSIONS):
+            text = data.decode('utf-8', errors='replace')
+        else:
+            text = extract_text_smart(io.BytesIO(data), tesseract_cmd)
+    except OCRError as e:
+        result['error'] = str(e)
+        return result
+    result['text'] = text
+    if text.strip():
+        result['rows'] = analyze_lab_text(text)
+    else:
+        result['error'] = 'No text extracted.'
+    return result
+
+
+def process_batch(
+    files: Iterable[Tuple[str, bytes]],
+    tesseract_cmd: str = "",
+    max_workers: Optional[int] = None,
+    on_done: Optional[Callable[[dict, int, int], None]] = None,
+) -> List[dict]:
+    """Process (name, bytes) pairs on a worker pool, in upload order.
+
+    on_done(result, finished, total) is called from the calling thread as
+    each file completes, so it is safe to update Streamlit widgets from it.
+    """
+    files = list(files)
+    results: List[Optional[dict]] = [None] * len(files)
+    with ThreadPoolExecutor(max_workers=max_workers or default_workers()) as pool:
+        futures = {
+            pool.submit(process_page, name, data, tesseract_cmd): i
+            for i, (name, data) in enumerate(files)
+        }
+        for finished, fut in enumerate(as_completed(futures), start=1):
+            i = futures[fut]
+            try:
+                results[i] = fut.result()
+            except Exception as e:
+                results[i] = {'file': files[i][0], 'text': '', 'rows': [], 'error': f"Processing failed: {e}"}
+            if on_done:
+                on_done(results[i], finished, len(files))
+    return results
+
+
+def combine_page_rows(results: List[dict]) -> List[dict]:
+    """Merge lab rows across pages, keeping per-file provenance.
+
+    Rows with the same test, value and unit (e.g. a header block repeated on
+    every page) collapse into one row whose Source lists every file it came
+    from. The same test with a different value stays as separate rows.
+    """
+    combined = {}
+    for res in results:
+        for r in res.get('rows', []):
+            key = (r['Test'].lower(), str(r['Value']), (r.get('Unit') or '').lower())
+            row = combined.get(key)
+            if row is None:
+                row = dict(r)
+                row['Source'] = [res['file']]
+                combined[key] = row
+            elif res['file'] not in row['Source']:
+                row['Source'].append(res['file'])
+    out = []
+    for row in combined.values():
+        row['Source'] = ", ".join(row['Source'])
+        out.append(row)
+    return out
+
+
+def combined_text(results: List[dict]) -> str:
+    """Concatenate page texts in upload order for the summary editor."""
+    return "\n".join(res['text'] for res in results if res.get('text', '').strip())
@@ -1,39 +1,133 @@
+"""Evaluate the fine-tuned summarizer with ROUGE.
+
+    python src/evaluate.py --config configs/config.yaml [--batch-size 16] [--limit 500]
+
+Generates in batches of similar input length under torch.inference_mode(),
+restores the original order and prints ROUGE with examples/sec (generation
+only; tokenized inputs come from the on-disk cache, see token_cache.py).
+A checkpoint trained with task prefixes (training_settings.json) is decoded
+with generate_dual_from_ids, and its doctor and patient summaries are scored
+separately against the target and patient_target references.
+"""
+
+import argparse
 import json
 import os
+
 from datasets import load_dataset
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-import evaluate
-
-# Paths
-test_file = "data/test.jsonl" if os.path.exists("data/test.jsonl") else "data/validation.jsonl"
-model_dir = "./results/checkpoint-best"   # Update if you want last checkpoint
-
-# Load dataset
-dataset = load_dataset("json", data_files={"test": test_file})
-test_data = dataset["test"]
-
-# Load model & tokenizer
-model_name = "google/flan-t5-small"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSeq2SeqLM.from_pretrained(model_dir)
-
-# Metric
-rouge = evaluate.load("rouge")
-
-# Generate predictions
-def generate_summary(example):
-    inputs = tokenizer(example["input"], return_tensors="pt", max_length=512, truncation=True)
-    output = model.generate(**inputs, max_length=128)
-    decoded = tokenizer.decode(output[0], skip_special_tokens=True)
-    return {"prediction": decoded}
-
-predictions = test_data.map(generate_summary)
-
-# Evaluate with ROUGE
-results = rouge.compute(
-    predictions=predictions["prediction"],
-    references=predictions["target"]
-)
-
-print("Evaluation Results:")
-print(results)
+
+from generation import generate_dual_from_ids, load_model, load_rouge, rouge_scores, timed_generate, training_settings
+from token_cache import DEFAULT_CACHE_DIR, dataset_fingerprint, load_or_build
+from preprocess import manifest_files
+from train import DEFAULT_CONFIG, INPUT_COLUMNS, PATIENT_COLUMNS, TARGET_COLUMNS, data_format, load_config, pick_columns
+
+
+def test_file(cfg: dict):
+    """paths.test_file (or val_file), or the test shards of paths.manifest."""
+    paths = cfg.get("paths", {})
+    if paths.get("manifest"):
+        shards = manifest_files(paths["manifest"])
+        return shards["test"] or shards["validation"]
+    path = paths.get("test_file", "data/test.jsonl")
+    return path if os.path.exists(path) else paths.get("val_file", "data/validation.jsonl")
+
+
+def tokenized_test_set(cfg: dict, data_file, tokenizer):
+    """Test split with input_ids (truncated to max_input_length), the reference column as "reference"
+    and the patient summary (None when missing) as "patient_reference"."""
+    max_input = cfg.get("max_input_length", 512)
+    settings = {'kind': "eval", 'max_input_length': max_input, 'input_columns': INPUT_COLUMNS, 'target_columns': TARGET_COLUMNS,
+                'patient_columns': PATIENT_COLUMNS}
+    cache_dir = cfg.get("paths", {}).get("tokenized_cache", DEFAULT_CACHE_DIR)
+    fingerprint = dataset_fingerprint({'test': data_file}, tokenizer, **settings) if cache_dir else ""
+
+    def build():
+        dataset = load_dataset(data_format({"test": data_file}), data_files={"test": data_file})
+        src_col, tgt_col = pick_columns(dataset["test"].column_names)
+        patient_col = next((c for c in PATIENT_COLUMNS if c in dataset["test"].column_names), None)
+
+        def preprocess(batch):
+            ids = tokenizer(batch[src_col], max_length=max_input, truncation=True)["input_ids"]
+            patient = batch[patient_col] if patient_col else [None] * len(ids)
+            return {"input_ids": ids, "reference": batch[tgt_col],
+                    "patient_reference": [t.strip() if isinstance(t, str) and t.strip() else None for t in patient]}
+
+        return dataset.map(preprocess, batched=True, remove_columns=dataset["test"].column_names)
+
+    return load_or_build(cache_dir, fingerprint, build, meta=dict(settings, files={'test': data_file}))["test"]
+
+
+def dual_budgets(cfg: dict) -> dict:
+    """Per-task max_new_tokens for a dual model: the doc/patient target lengths it was trained with."""
+    return {'doctor': cfg.get("doc_target_max_len", 128), 'patient': cfg.get("patient_target_max_len", 110)}
+
+
+def generate_for_eval(model, tokenizer, cfg: dict, model_dir: str, encoded, batch_size: int):
+    """(predictions, examples/sec) decoded the way the checkpoint was trained.
+
+    A single-task model gives a list of summaries. A dual model
+    (task_prefixes in its training settings) gives {task: summaries} from
+    generate_dual_from_ids, whose decoder prompts are cut off the output, so
+    the summaries carry no "doctor:"/"patient:" prefix.
+    """
+    eval_cfg = cfg.get("eval", {})
+    num_beams = eval_cfg.get("num_beams", 1)
+    prefixes = training_settings(model_dir).get("task_prefixes")
+    if prefixes:
+        return timed_generate(model, tokenizer, encoded, generate=generate_dual_from_ids, prefixes=prefixes,
+                              max_new_tokens=dual_budgets(cfg), batch_size=batch_size, num_beams=num_beams)
+    return timed_generate(model, tokenizer, encoded, batch_size=batch_size, num_beams=num_beams,
+                          max_new_tokens=eval_cfg.get("max_new_tokens", cfg.get("max_target_length", 128)))
+
+
+def score(predictions, data, rouge) -> dict:
+    """ROUGE of generate_for_eval predictions: flat for a single-task model; for a dual model
+    {'doctor': vs "reference", 'patient': vs "patient_reference" where there is one}."""
+    if not isinstance(predictions, dict):
+        return rouge_scores(predictions, data["reference"], rouge)
+    results = {'doctor': rouge_scores(predictions['doctor'], data["reference"], rouge)}
+    pairs = [(p, r) for p, r in zip(predictions['patient'], data["patient_reference"]) if r]
+    if pairs:
+        results['patient'] = rouge_scores([p for p, _ in pairs], [r for _, r in pairs], rouge)
+    results['patient_examples'] = len(pairs)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the fine-tuned summarizer with ROUGE.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    parser.add_argument("--model-dir", help="default: eval.model_dir, then train.output_dir")
+    parser.add_argument("--data-file", help="JSONL to evaluate; default: paths.test_file or the manifest's test shards")
+    parser.add_argument("--batch-size", type=int, help="default: eval.batch_size")
+    parser.add_argument("--quantize", action="store_true", help="dynamic int8 quantization (default: eval.quantize)")
+    parser.add_argument("--limit", type=int, help="only the first N examples")
+    parser.add_argument("--json", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    cfg = load_config(args.config)
+    eval_cfg = cfg.get("eval", {})
+    model_dir = args.model_dir or eval_cfg.get("model_dir") or cfg.get("train", {}).get("output_dir", "./results")
+    data_file = args.data_file or test_file(cfg)
+
+    quantize = args.quantize or eval_cfg.get("quantize", False)
+    tokenizer, model = load_model(model_dir, cfg.get("base_model", "google/flan-t5-small"), quantize=quantize)
+    test_data = tokenized_test_set(cfg, data_file, tokenizer)
+    if args.limit:
+        test_data = test_data.select(range(min(args.limit, len(test_data))))
+
+    rouge = load_rouge()
+    predictions, per_sec = generate_for_eval(model, tokenizer, cfg, model_dir, test_data["input_ids"],
+                                             batch_size=args.batch_size or eval_cfg.get("batch_size", 16))
+    results = score(predictions, test_data, rouge)
+    results["examples"] = len(test_data)
+    results["examples_per_sec"] = round(per_sec, 2)
+
+    print(f"Evaluation Results ({model_dir}{' int8' if quantize else ''} on {data_file}):")
+    print(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'model_dir': model_dir, 'quantized': quantize, 'data_file': data_file, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
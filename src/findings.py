@@ -0,0 +1,137 @@
+"""Rule-based narrative findings (doctor and patient wording).
+
+Shared by the Streamlit app and the HTTP service; no UI dependencies.
+"""
+
+from typing import List, Tuple
+
+def comprehensive_summarize(text: str) -> Tuple[List[str], List[str]]:
+    """Extract explicit positive and negative findings using keyword + negation rules."""
+    import re
+    text_lower = text.lower()
+    findings = {
+        # Core systems
+        "cardiomegaly": "cardiomegaly",
+        "pneumonia": "pneumonia",
+        "consolidation": "consolidation",
+        "atelectasis": "atelectasis",
+        "pleural effusion": "pleural effusion",
+        "pneumothorax": "pneumothorax",
+        "edema": "pulmonary edema",
+        # Abdomen
+        "hepatomegaly": "hepatomegaly",
+        "fatty infiltration": "fatty infiltration",
+        "splenomegaly": "splenomegaly",
+        "hydronephrosis": "hydronephrosis",
+        "renal cortical cyst": "renal cortical cyst",
+        "cortical cyst": "cortical cyst",
+        "kidney cyst": "kidney cyst",
+        "gallstones": "gallstones",
+        # Lymph
+        "lymphadenopathy": "lymphadenopathy",
+    }
+    neg_scoped_patterns = [
+        r"\bno\s+(?:evidence\s+of\s+)?{term}\b",
+        r"\bwithout\s+{term}\b",
+        r"\babsent\s+{term}\b",
+        r"\bnegative\s+for\s+{term}\b",
+        r"\b{term}\s+(?:is|are)?\s*not\s+(?:seen|present|identified)\b",
+    ]
+    def is_negated(sentence: str, term: str) -> bool:
+        esc = re.escape(term)
+        for pat in neg_scoped_patterns:
+            if re.search(pat.format(term=esc), sentence, flags=re.IGNORECASE):
+                return True
+        return False
+    pos, neg = [], []
+    sentences = re.split(r"[.!?]+", text_lower)
+    for s in sentences:
+        s = s.strip()
+        if not s:
+            continue
+        for term, label in findings.items():
+            if term in s:
+                if is_negated(s, term):
+                    neg.append(f"no {label}")
+                else:
+                    pos.append(label)
+    # dedupe preserve order
+    pos = list(dict.fromkeys(pos))
+    neg = list(dict.fromkeys(neg))
+    return pos, neg
+
+def to_patient_friendly(findings: List[str]) -> List[str]:
+    mapping = {
+        "cardiomegaly": "enlarged heart",
+        "pneumonia": "lung infection",
+        "consolidation": "areas of lung tissue that appear solid",
+        "atelectasis": "partial collapse of small lung areas",
+        "pleural effusion": "fluid around the lungs",
+        "pneumothorax": "collapsed lung",
+        "pulmonary edema": "excess fluid in lung tissue",
+        "hepatomegaly": "enlarged liver",
+        "fatty infiltration": "fat deposits in the liver",
+        "splenomegaly": "enlarged spleen",
+        "hydronephrosis": "kidney swelling from urine backup",
+        "renal cortical cyst": "fluid-filled cyst in the kidney",
+        "cortical cyst": "fluid-filled cyst in the kidney",
+        "kidney cyst": "fluid-filled cyst in the kidney",
+        "gallstones": "stones in the gallbladder",
+        "lymphadenopathy": "enlarged lymph nodes",
+    }
+    return [mapping.get(x, x) for x in findings]
+
+def fallback_findings_from_prose(text: str) -> List[str]:
+    """Heuristic fallback to extract common clinical statements from narrative prose.
+    Captures patterns like 'low hemoglobin', 'WBC high', 'ALT slightly raised',
+    'blood sugar high', 'urine protein/cloudiness', and 'kidney strain'.
+    """
+    import re
+    t = text.lower()
+    f: List[str] = []
+    def seen(label: str) -> bool:
+        return any(label in x for x in f)
+    # Anemia / hemoglobin
+    if re.search(r"hemoglobin[^\n\.]*?(low|decreas|reduc)", t) and not seen("hemoglobin"):
+        f.append("low hemoglobin (possible anemia)")
+    # White blood cells elevated
+    if (re.search(r"(white\s*blood\s*cells?|wbc)[^\n\.]*?(high|elevat|raised|increase)", t) or
+        re.search(r"(high|elevat|raised|increase)[^\n\.]*?(white\s*blood\s*cells?|wbc)", t)) and not seen("white blood cells"):
+        f.append("elevated white blood cells (possible infection/inflammation)")
+    # Protein levels low (serum)
+    if re.search(r"protein\s+levels?[^\n\.]*?(low|decreas|reduc)", t) and not seen("protein"):
+        f.append("low blood protein levels")
+    # Blood sugar / glucose high
+    if (re.search(r"(blood\s*sugar|glucose)[^\n\.]*?(high|elevat|raised|increase)", t) or
+        re.search(r"(high|elevat|raised|increase)[^\n\.]*?(blood\s*sugar|glucose)", t)) and not seen("blood sugar"):
+        f.append("high blood sugar")
+    # ALT raised
+    if re.search(r"\balt\b|alanine\s+aminotransferase", t):
+        if re.search(r"(slightly\s+)?(raised|high|elevat|increase)", t):
+            f.append("ALT slightly elevated")
+    # Kidney strain / creatinine mention
+    if (re.search(r"kidney[^\n\.]*?(strain|stress|issue|problem)", t) or
+        re.search(r"creatinine[^\n\.]*?(high|elevat|raised)", t)) and not seen("kidney"):
+        f.append("possible kidney strain")
+    # Urine protein / cloudiness
+    if (re.search(r"urine[^\n\.]*?(protein|albumin)[^\n\.]*?(present|trace|mild|\+)", t) or
+        re.search(r"urine[^\n\.]*?(cloud(y|iness)|turbid)", t)) and not seen("urine"):
+        f.append("urine protein/cloudiness present")
+    return f
+
+def summarize_findings(text: str) -> Tuple[List[str], List[str], List[str], List[str]]:
+    """Technical and patient-friendly findings: (pos, neg, pos_h, neg_h)."""
+    pos, neg = comprehensive_summarize(text)
+    # If rule-based extraction finds nothing, try prose fallback
+    if not pos and not neg:
+        fb = fallback_findings_from_prose(text)
+        if fb:
+            pos = fb
+    pos_h = to_patient_friendly(pos)
+    neg_h = []
+    for n in neg:
+        if n.startswith("no "):
+            neg_h.append("no " + to_patient_friendly([n[3:]])[0])
+        else:
+            neg_h.append(n)
+    return pos, neg, pos_h, neg_h
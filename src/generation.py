@@ -0,0 +1,199 @@
+"""Batched summary generation and ROUGE scoring for the fine-tuned model."""
+
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from length_buckets import bucket_batches
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of the model's Linear layers (CPU inference only).
+
+    Weights are stored as int8 and activations are quantized on the fly per
+    batch, so no calibration data is needed.
+    """
+    engines = torch.backends.quantized.supported_engines
+    if "fbgemm" not in engines and "qnnpack" in engines:
+        torch.backends.quantized.engine = "qnnpack"  # ARM
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_model(model_dir: str, base_model: str = "google/flan-t5-small", quantize: bool = False):
+    """(tokenizer, model) in eval mode; the tokenizer falls back to base_model if model_dir has none.
+
+    quantize=True applies quantize_int8 to the loaded fp32 weights.
+    """
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    except (OSError, ValueError):
+        tokenizer = AutoTokenizer.from_pretrained(base_model)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_dir, torch_dtype=torch.float32).eval()
+    if quantize:
+        model = quantize_int8(model)
+    return tokenizer, model
+
+
+def encode(tokenizer, texts: List[str], max_input_length: int = 512) -> List[List[int]]:
+    return tokenizer(list(texts), max_length=max_input_length, truncation=True)["input_ids"]
+
+
+def generate_from_ids(model, tokenizer, encoded: List[List[int]], batch_size: int = 16,
+                      max_new_tokens: int = 128, num_beams: int = 1) -> List[str]:
+    """Summaries for already tokenized inputs, in input order.
+
+    Inputs are grouped into batches of similar length (so little of each
+    batch is padding) and generated under inference_mode.
+    """
+    lengths = [len(ids) for ids in encoded]
+    outputs: List[str] = [""] * len(encoded)
+    with torch.inference_mode():
+        for batch in bucket_batches(lengths, batch_size, shuffle=False):
+            enc = tokenizer.pad({"input_ids": [list(encoded[i]) for i in batch]}, return_tensors="pt")
+            generated = model.generate(**enc, max_new_tokens=max_new_tokens, num_beams=num_beams)
+            for i, summary in zip(batch, tokenizer.batch_decode(generated, skip_special_tokens=True)):
+                outputs[i] = summary
+    return outputs
+
+
+def generate_summaries(model, tokenizer, texts: List[str], max_input_length: int = 512, **kwargs) -> List[str]:
+    """Summaries for texts, in input order (see generate_from_ids)."""
+    return generate_from_ids(model, tokenizer, encode(tokenizer, texts, max_input_length), **kwargs)
+
+
+# Decoder prompts that select the output of a dual-summary model (see train.py)
+TASK_PREFIXES = {'doctor': "doctor:", 'patient': "patient:"}
+# Written by train.py next to the checkpoint (task_prefixes is null for a single-task model)
+TRAINING_SETTINGS = "training_settings.json"
+
+
+def training_settings(model_dir: str) -> dict:
+    """Settings train.py saved with the checkpoint in model_dir ({} if it has none)."""
+    path = os.path.join(model_dir, TRAINING_SETTINGS)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def decoder_prompt(model, tokenizer, prefix: str) -> List[int]:
+    """Decoder start token followed by the prefix tokens."""
+    return [model.config.decoder_start_token_id] + tokenizer(prefix, add_special_tokens=False)["input_ids"]
+
+
+def generate_dual_from_ids(model, tokenizer, encoded: List[List[int]], max_new_tokens: Dict[str, int],
+                           prefixes: Dict[str, str] = None, batch_size: int = 16,
+                           num_beams: int = 1) -> Dict[str, List[str]]:
+    """One summary per task for each input, from a single encoder pass per batch.
+
+    The encoder output of a batch is computed once and every task decodes
+    from it, steered by its decoder prompt (TASK_PREFIXES). Returns
+    {task: summaries in input order}; max_new_tokens is per task.
+    """
+    from transformers.modeling_outputs import BaseModelOutput
+    prefixes = prefixes or TASK_PREFIXES
+    prompts = {task: decoder_prompt(model, tokenizer, prefix) for task, prefix in prefixes.items()}
+    lengths = [len(ids) for ids in encoded]
+    outputs = {task: [""] * len(encoded) for task in prefixes}
+    encoder = model.get_encoder()
+    with torch.inference_mode():
+        for batch in bucket_batches(lengths, batch_size, shuffle=False):
+            enc = tokenizer.pad({"input_ids": [list(encoded[i]) for i in batch]}, return_tensors="pt")
+            hidden = encoder(input_ids=enc["input_ids"], attention_mask=enc["attention_mask"]).last_hidden_state
+            for task, prompt in prompts.items():
+                decoder_input_ids = torch.tensor([prompt] * len(batch), dtype=torch.long)
+                # A fresh wrapper per task: generate() expands encoder_outputs in place for beam search
+                generated = model.generate(encoder_outputs=BaseModelOutput(last_hidden_state=hidden),
+                                           attention_mask=enc["attention_mask"], decoder_input_ids=decoder_input_ids,
+                                           max_new_tokens=max_new_tokens[task], num_beams=num_beams)
+                texts = tokenizer.batch_decode(generated[:, len(prompt):], skip_special_tokens=True)
+                for i, summary in zip(batch, texts):
+                    outputs[task][i] = summary.strip()
+    return outputs
+
+
+def generate_dual(model, tokenizer, texts: List[str], max_input_length: int = 512, **kwargs) -> Dict[str, List[str]]:
+    """generate_dual_from_ids for raw texts."""
+    return generate_dual_from_ids(model, tokenizer, encode(tokenizer, texts, max_input_length), **kwargs)
+
+
+def generate_separately_from_ids(model, tokenizer, encoded: List[List[int]], max_new_tokens: Dict[str, int],
+                                 prefixes: Dict[str, str] = None, batch_size: int = 16,
+                                 num_beams: int = 1) -> Dict[str, List[str]]:
+    """Same outputs as generate_dual_from_ids, but one full generate() (encoder included) per task.
+
+    The baseline for scripts/bench_dual.py.
+    """
+    prefixes = prefixes or TASK_PREFIXES
+    lengths = [len(ids) for ids in encoded]
+    outputs = {task: [""] * len(encoded) for task in prefixes}
+    with torch.inference_mode():
+        for task, prefix in prefixes.items():
+            prompt = decoder_prompt(model, tokenizer, prefix)
+            for batch in bucket_batches(lengths, batch_size, shuffle=False):
+                enc = tokenizer.pad({"input_ids": [list(encoded[i]) for i in batch]}, return_tensors="pt")
+                decoder_input_ids = torch.tensor([prompt] * len(batch), dtype=torch.long)
+                generated = model.generate(**enc, decoder_input_ids=decoder_input_ids,
+                                           max_new_tokens=max_new_tokens[task], num_beams=num_beams)
+                texts = tokenizer.batch_decode(generated[:, len(prompt):], skip_special_tokens=True)
+                for i, summary in zip(batch, texts):
+                    outputs[task][i] = summary.strip()
+    return outputs
+
+
+def batch_generator(model, tokenizer, max_input_length: int = 512, max_new_tokens: int = 128,
+                    num_beams: int = 1, dual_max_new_tokens: Optional[Dict[str, int]] = None):
+    """fn(texts) -> summaries that runs all texts as one generate() call (for microbatch.MicroBatcher).
+
+    With dual_max_new_tokens (a model trained with task prefixes) each
+    result is {'doctor', 'patient'} from one encoder pass (generate_dual).
+    """
+
+    def generate(texts: List[str]) -> List[str]:
+        return generate_summaries(model, tokenizer, texts, max_input_length=max_input_length, batch_size=len(texts),
+                                  max_new_tokens=max_new_tokens, num_beams=num_beams)
+
+    def generate_both(texts: List[str]) -> List[Dict[str, str]]:
+        out = generate_dual(model, tokenizer, texts, max_input_length=max_input_length, batch_size=len(texts),
+                            max_new_tokens=dual_max_new_tokens, num_beams=num_beams)
+        return [{'doctor': d, 'patient': p} for d, p in zip(out['doctor'], out['patient'])]
+
+    return generate_both if dual_max_new_tokens else generate
+
+
+def timed_generate(model, tokenizer, encoded: List[List[int]], generate=generate_from_ids, **kwargs) -> Tuple[object, float]:
+    """(generate(...) output, examples per second); generate may also be generate_dual_from_ids."""
+    start = time.perf_counter()
+    summaries = generate(model, tokenizer, encoded, **kwargs)
+    elapsed = time.perf_counter() - start
+    return summaries, (len(encoded) / elapsed if elapsed > 0 else 0.0)
+
+
+def load_rouge():
+    """evaluate.load('rouge').
+
+    src/evaluate.py has the same name as the Hugging Face package, so src is
+    taken off sys.path while the package is imported.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    saved = list(sys.path)
+    cached = sys.modules.get("evaluate")
+    if cached is not None and not hasattr(cached, "load"):
+        del sys.modules["evaluate"]
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or os.curdir) != here]
+    try:
+        import evaluate
+    finally:
+        sys.path[:] = saved
+    return evaluate.load("rouge")
+
+
+def rouge_scores(predictions: List[str], references: List[str], rouge=None) -> Dict[str, float]:
+    rouge = rouge or load_rouge()
+    scores = rouge.compute(predictions=predictions, references=references)
+    return {k: round(float(v), 4) for k, v in scores.items()}
@@ -0,0 +1,160 @@
+"""Persistent analysis history backed by SQLite.
+
+Analyses are keyed by a hash of the whitespace-normalized report text, the
+store's version (each UI passes one for its own summarizer) and the owner,
+so re-submitting a report that was already analyzed is a single indexed
+lookup instead of a recompute, and a summarizer change stops stale results
+from being returned. Entries belong to an owner (a UI session) and are only
+listed to it; owner "" is the history shared by everyone, which the UIs use
+only when ANALYSIS_HISTORY_SHARED=1. Only the rows a page asks for are
+read, which keeps memory use independent of how long the history grows.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Iterable, List, Optional
+
+DEFAULT_DB_PATH = os.environ.get("ANALYSIS_HISTORY_DB", os.path.join(".cache", "analysis_history.db"))
+# One history for all sessions (single-user installs); otherwise each session sees only its own entries
+SHARED_HISTORY = os.environ.get("ANALYSIS_HISTORY_SHARED", "") == "1"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    text_hash   TEXT NOT NULL,
+    source      TEXT NOT NULL DEFAULT '',
+    owner       TEXT NOT NULL DEFAULT '',
+    created_at  REAL NOT NULL,
+    preview     TEXT NOT NULL,
+    report_text TEXT NOT NULL,
+    results     TEXT NOT NULL,
+    PRIMARY KEY (text_hash, source)
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_created_at ON analyses (created_at);
+CREATE TABLE IF NOT EXISTS analysis_names (
+    text_hash TEXT NOT NULL,
+    source    TEXT NOT NULL,
+    name      TEXT NOT NULL,
+    PRIMARY KEY (text_hash, source, name),
+    FOREIGN KEY (text_hash, source) REFERENCES analyses (text_hash, source) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_analysis_names_name ON analysis_names (name);
+"""
+
+
+def text_hash(text: str, version: str = "", owner: str = "") -> str:
+    """Stable key for a report: sha256 of the version, the owner and the text with whitespace collapsed."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{version}\0{owner}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def _preview(text: str) -> str:
+    return text[:100] + "..." if len(text) > 100 else text
+
+
+class HistoryStore:
+    """SQLite (WAL mode) store of past analyses.
+
+    Each call opens its own short-lived connection, so one store can be shared
+    across Streamlit sessions and threads. version (the UI's summarizer
+    version) is part of every key; entries saved under another version stay
+    listed in recent()/search() but get() no longer returns them. owner is
+    passed per call, since one store serves every session.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, version: str = ""):
+        self.path = path
+        self.version = version
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Databases created before entries had an owner
+            if "owner" not in {r["name"] for r in conn.execute("PRAGMA table_info(analyses)")}:
+                conn.execute("ALTER TABLE analyses ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_owner ON analyses (owner, source, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def save(self, report_text: str, results: dict, names: Iterable[str] = (), source: str = "",
+             owner: str = "") -> str:
+        """Insert or replace the analysis of report_text; returns its hash.
+
+        names are the test/finding names the entry should be searchable by.
+        """
+        key = text_hash(report_text, self.version, owner)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM analysis_names WHERE text_hash = ? AND source = ?", (key, source))
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (text_hash, source, owner, created_at, preview, report_text, results) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, source, owner, time.time(), _preview(report_text), report_text, json.dumps(results)),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO analysis_names (text_hash, source, name) VALUES (?, ?, ?)",
+                [(key, source, n.strip().lower()) for n in names if n and n.strip()],
+            )
+        return key
+
+    def get(self, report_text: str, source: str = "", owner: str = "") -> Optional[dict]:
+        """Stored results for report_text, or None if owner never analyzed it."""
+        return self.load(text_hash(report_text, self.version, owner), source, owner)
+
+    def load(self, key: str, source: str = "", owner: str = "") -> Optional[dict]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT results FROM analyses WHERE text_hash = ? AND source = ? AND owner = ?", (key, source, owner)
+            ).fetchone()
+        return json.loads(row["results"]) if row else None
+
+    def entry(self, key: str, source: str = "", owner: str = "") -> Optional[dict]:
+        """Full history entry (metadata, report text and results)."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM analyses WHERE text_hash = ? AND source = ? AND owner = ?", (key, source, owner)
+            ).fetchone()
+        if not row:
+            return None
+        out = dict(row)
+        out["results"] = json.loads(out["results"])
+        return out
+
+    def recent(self, limit: int = 5, source: Optional[str] = None, owner: str = "") -> List[dict]:
+        """owner's newest entries first (without the full text or results)."""
+        sql = "SELECT text_hash, created_at, source, preview FROM analyses WHERE owner = ?"
+        args: list = [owner]
+        if source is not None:
+            sql += " AND source = ?"
+            args.append(source)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        with closing(self._connect()) as conn:
+            return [dict(r) for r in conn.execute(sql, args)]
+
+    def search(self, name: str, source: Optional[str] = None, limit: int = 20, owner: str = "") -> List[dict]:
+        """owner's entries mentioning a test/finding name (prefix match), newest first."""
+        prefix = name.strip().lower()
+        sql = ("SELECT DISTINCT a.text_hash, a.created_at, a.source, a.preview "
+               "FROM analysis_names n JOIN analyses a ON a.text_hash = n.text_hash AND a.source = n.source "
+               "WHERE n.name >= ? AND n.name < ? AND a.owner = ?")
+        args: list = [prefix, prefix + "\uffff", owner]
+        if source is not None:
+            sql += " AND n.source = ?"
+            args.append(source)
+        sql += " ORDER BY a.created_at DESC LIMIT ?"
+        args.append(limit)
+        with closing(self._connect()) as conn:
+            return [dict(r) for r in conn.execute(sql, args)]
+
+    def count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
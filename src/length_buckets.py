@@ -0,0 +1,47 @@
+"""Length-bucketed batching: put examples of similar tokenized length in the same batch."""
+
+import random
+from typing import List, Sequence
+
+
+def bucket_batches(lengths: Sequence[int], batch_size: int, batches_per_bucket: int = 16,
+                   seed: int = 0, shuffle: bool = True) -> List[List[int]]:
+    """Batches of example indices grouped by length.
+
+    Examples are sorted by length (ties broken randomly) and cut into buckets
+    of batches_per_bucket * batch_size; each bucket is shuffled and split into
+    batches, and the batch order is shuffled. With shuffle=False the batches
+    are simply consecutive runs of the length-sorted order (for evaluation).
+    Only the last batch can be smaller than batch_size.
+    """
+    rnd = random.Random(seed)
+    order = list(range(len(lengths)))
+    if shuffle:
+        rnd.shuffle(order)
+    order.sort(key=lambda i: lengths[i])  # stable: the shuffle breaks ties
+    if not shuffle:
+        return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+    bucket = max(1, batches_per_bucket) * batch_size
+    batches = []
+    for start in range(0, len(order), bucket):
+        members = order[start:start + bucket]
+        rnd.shuffle(members)
+        batches.extend(members[i:i + batch_size] for i in range(0, len(members), batch_size))
+    tail = batches.pop() if batches and len(batches[-1]) < batch_size else None
+    rnd.shuffle(batches)
+    if tail:
+        batches.append(tail)  # keep the short batch last so a flat index stream re-batches identically
+    return batches
+
+
+def padding_ratio(lengths: Sequence[int], batches: List[List[int]]) -> float:
+    """Share of padded positions when each batch is padded to its longest example."""
+    real = padded = 0
+    for batch in batches:
+        if not batch:
+            continue
+        longest = max(lengths[i] for i in batch)
+        real += sum(lengths[i] for i in batch)
+        padded += longest * len(batch)
+    return 1 - real / padded if padded else 0.0
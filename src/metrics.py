@@ -0,0 +1,160 @@
+"""Prometheus text-format metrics without a client library.
+
+Counters and histograms are plain in-process objects, updated from the
+event loop; render() produces the text exposition format (version 0.0.4)
+served at /metrics. Gauges are read from callbacks at render time.
+"""
+
+import bisect
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Pipeline span names -> stage label
+STAGE_ALIASES = {
+    'parse_lab_table': 'parse',
+    'normalize_lab_rows': 'normalize',
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, n: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + n
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        out += [f"{self.name}{_labels(k)} {_fmt(v)}" for k, v in sorted(self.values.items())]
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self.values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, n) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                out.append(f"{self.name}_bucket{_labels(key, ('le', _fmt(float(bound))))} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(key)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_labels(key)} {n}")
+        return out
+
+
+class Gauge:
+    """Metric whose samples come from a callback returning {label key: value}.
+
+    kind='counter' exposes totals that another object already keeps.
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], Dict[LabelKey, float]], kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        out += [f"{self.name}{_labels(k)} {_fmt(v)}" for k, v in sorted(self.read().items())]
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], Dict[LabelKey, float]], kind: str = "gauge") -> Gauge:
+        return self.register(Gauge(name, help, read, kind))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "report_stage_duration_seconds", "Time spent in each pipeline stage (ocr, parse, detect:*, normalize, summarize, render).")
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "End-to-end request latency by endpoint and status.")
+DETECTOR_FIRED = REGISTRY.counter(
+    "freeform_detector_fired_total", "Reports where a detect_*_freeform fallback added at least one row.")
+DETECTOR_ROWS = REGISTRY.counter(
+    "freeform_detector_rows_total", "Lab rows added by each freeform fallback.")
+REPORT_ROWS = REGISTRY.histogram(
+    "report_lab_rows", "Lab rows extracted per computed report.", ROW_BUCKETS)
+JOBS = REGISTRY.counter(
+    "report_jobs_total", "Reports computed (not served from cache or coalesced), by op.")
+
+
+def stage_label(span_name: str) -> str:
+    return STAGE_ALIASES.get(span_name, span_name)
+
+
+def record_job(op: str, spans: Iterable[tuple], counts: Dict[str, int], result: dict) -> None:
+    """Record one computed report: its stage spans, detector counts and row count."""
+    JOBS.inc(op=op)
+    for stage, _, duration_ms in spans:
+        STAGE_SECONDS.observe(duration_ms / 1000.0, stage=stage_label(stage))
+    for event, n in counts.items():
+        if event.startswith('detect:'):
+            detector = event.split(':', 1)[1]
+            if n > 0:
+                DETECTOR_FIRED.inc(detector=detector)
+            DETECTOR_ROWS.inc(n, detector=detector)
+    if isinstance(result, dict) and 'rows' in result:
+        REPORT_ROWS.observe(len(result['rows']), op=op)
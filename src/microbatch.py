@@ -0,0 +1,150 @@
+"""Dynamic micro-batching: gather concurrent requests into one batched call.
+
+A MicroBatcher owns one worker thread. Callers submit single items and get
+a Future; the worker takes the first waiting item, keeps collecting until
+max_batch items are in hand or max_wait_ms has passed since that first
+item, then calls fn(items) once and hands each caller its own result. A
+lone request therefore waits at most max_wait_ms extra, while under load
+batches fill up and one padded generate() call serves many requests.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Run fn(list_of_items) -> list_of_results over batches of submitted items."""
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch: int = 8, max_wait_ms: float = 5.0,
+                 name: str = "generate"):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # Guards _closed, so nothing is queued behind _STOP
+        self._lock = threading.Lock()
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+        self.failed_batches = 0
+        self.largest_batch = 0
+        self.batch_sizes: dict = {}
+        # Time from submit() to the start of the item's batch
+        self.total_wait_s = 0.0
+        self.busy_s = 0.0
+
+    def start(self) -> "MicroBatcher":
+        with self._lock:
+            if self._thread is None:
+                self._closed = False
+                self._thread = threading.Thread(target=self._loop, name=f"microbatch-{self.name}", daemon=True)
+                self._thread.start()
+        return self
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop taking items; queued ones still run, later submit() calls raise."""
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        if wait:
+            thread.join()
+        with self._lock:
+            if self._thread is thread:
+                self._thread = None
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item; the Future resolves to its result (or the batch's exception)."""
+        fut: Future = Future()
+        with self._lock:
+            if self._thread is None or self._closed:
+                raise RuntimeError(f"MicroBatcher {self.name!r} is not running.")
+            self._queue.put((item, fut, time.perf_counter()))
+        return fut
+
+    async def run(self, item: Any) -> Any:
+        """submit() for asyncio callers."""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _collect(self) -> tuple:
+        """(batch of (item, future, submitted) entries, stop requested)."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch:
+            try:
+                timeout = deadline - time.perf_counter()
+                entry = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _loop(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            self._run_batch(batch)
+        # Nothing should be left behind _STOP, but never leave a caller waiting
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP and entry[1].set_running_or_notify_cancel():
+                entry[1].set_exception(RuntimeError(f"MicroBatcher {self.name!r} shut down."))
+
+    def _run_batch(self, batch: list) -> None:
+        # Drop callers that cancelled while waiting
+        batch = [e for e in batch if e[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            results = self.fn([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name} returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            self.failed_batches += 1
+            for _, fut, _ in batch:
+                fut.set_exception(e)
+        else:
+            for (_, fut, _), result in zip(batch, results):
+                fut.set_result(result)
+        self.busy_s += time.perf_counter() - start
+        n = len(batch)
+        self.batches += 1
+        self.items += n
+        self.largest_batch = max(self.largest_batch, n)
+        self.batch_sizes[n] = self.batch_sizes.get(n, 0) + 1
+        self.total_wait_s += sum(start - submitted for _, _, submitted in batch)
+
+    def stats(self) -> dict:
+        return {
+            'name': self.name,
+            'max_batch': self.max_batch,
+            'max_wait_ms': round(self.max_wait_s * 1000.0, 3),
+            'batches': self.batches,
+            'items': self.items,
+            'failed_batches': self.failed_batches,
+            'mean_batch': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'batch_sizes': dict(sorted(self.batch_sizes.items())),
+            'mean_queue_wait_ms': round(1000.0 * self.total_wait_s / self.items, 2) if self.items else 0.0,
+            'busy_s': round(self.busy_s, 3),
+            'waiting': self._queue.qsize(),
+        }
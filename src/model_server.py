@@ -0,0 +1,87 @@
+"""Micro-batching HTTP server for the seq2seq summarizer (CPU).
+
+Run with:  MODEL_DIR=results uvicorn model_server:app --app-dir src --port 8001
+
+Concurrent POST /generate requests are gathered by a MicroBatcher (up to
+GEN_MAX_BATCH texts, waiting at most GEN_MAX_WAIT_MS after the first) and
+answered from one padded generate() call. With MODEL_DUAL=1 (a model
+trained with doctor/patient task prefixes) each answer carries both
+summaries, decoded from one encoder pass. Point the main API at it with
+MODEL_SERVER_URL=http://localhost:8001 so /hybrid narratives from every API
+worker share the batches.
+"""
+
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from microbatch import MicroBatcher
+
+MODEL_DIR = os.environ.get("MODEL_DIR", "results")
+GEN_MAX_BATCH = int(os.environ.get("GEN_MAX_BATCH", "8"))
+GEN_MAX_WAIT_MS = float(os.environ.get("GEN_MAX_WAIT_MS", "5"))
+GEN_MAX_INPUT = int(os.environ.get("GEN_MAX_INPUT_TOKENS", "512"))
+GEN_MAX_NEW_TOKENS = int(os.environ.get("GEN_MAX_NEW_TOKENS", "128"))
+GEN_NUM_BEAMS = int(os.environ.get("GEN_NUM_BEAMS", "1"))
+# Dynamic int8 Linear layers (generation.quantize_int8)
+GEN_QUANTIZE = os.environ.get("GEN_QUANTIZE", "0") == "1"
+MODEL_DUAL = os.environ.get("MODEL_DUAL", "0") == "1"
+GEN_DOCTOR_MAX_NEW_TOKENS = int(os.environ.get("GEN_DOCTOR_MAX_NEW_TOKENS", "128"))
+GEN_PATIENT_MAX_NEW_TOKENS = int(os.environ.get("GEN_PATIENT_MAX_NEW_TOKENS", "110"))
+MAX_TEXT_CHARS = int(os.environ.get("API_MAX_TEXT_CHARS", "200000"))
+
+
+class GenerateIn(BaseModel):
+    text: str
+
+
+batcher = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global batcher
+    from generation import batch_generator, load_model
+    tokenizer, model = load_model(MODEL_DIR, quantize=GEN_QUANTIZE)
+    budgets = {'doctor': GEN_DOCTOR_MAX_NEW_TOKENS, 'patient': GEN_PATIENT_MAX_NEW_TOKENS}
+    generate_batch = batch_generator(model, tokenizer, max_input_length=GEN_MAX_INPUT,
+                                     max_new_tokens=GEN_MAX_NEW_TOKENS, num_beams=GEN_NUM_BEAMS,
+                                     dual_max_new_tokens=budgets if MODEL_DUAL else None)
+    batcher = MicroBatcher(generate_batch, GEN_MAX_BATCH, GEN_MAX_WAIT_MS).start()
+    # First call pays for lazy initialisation; keep it out of request latency
+    batcher.submit("Mild cardiomegaly. No pleural effusion.").result()
+    try:
+        yield
+    finally:
+        batcher.shutdown()
+
+
+app = FastAPI(title="Medical Report Summarizer model server", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    # Everything that changes /generate output: the API puts it in its /hybrid ETags
+    return {'status': 'ok', 'model_dir': MODEL_DIR, 'quantized': GEN_QUANTIZE, 'dual': MODEL_DUAL,
+            'max_input_tokens': GEN_MAX_INPUT, 'max_new_tokens': GEN_MAX_NEW_TOKENS, 'num_beams': GEN_NUM_BEAMS,
+            'doctor_max_new_tokens': GEN_DOCTOR_MAX_NEW_TOKENS, 'patient_max_new_tokens': GEN_PATIENT_MAX_NEW_TOKENS}
+
+
+@app.get("/stats")
+async def stats():
+    """Micro-batch counts, batch-size distribution and mean queue wait."""
+    return batcher.stats()
+
+
+@app.post("/generate")
+async def generate(body: GenerateIn):
+    """Text -> {'summary'} (or {'doctor', 'patient'} with MODEL_DUAL), computed in a micro-batch."""
+    text = body.text.strip()
+    if not text:
+        raise HTTPException(status_code=422, detail="text must not be empty.")
+    if len(text) > MAX_TEXT_CHARS:
+        raise HTTPException(status_code=413, detail=f"text exceeds {MAX_TEXT_CHARS} characters.")
+    result = await batcher.run(text)
+    return result if MODEL_DUAL else {'summary': result}
@@ -0,0 +1,106 @@
+"""Tesseract OCR helpers that do not depend on Streamlit.
+
+Failures raise OCRError with a user-facing message; callers decide how to
+surface it (st.error in the app, a per-file error in batch mode).
+"""
+
+
+class OCRError(RuntimeError):
+    """OCR could not run or produced an error."""
+
+
+def _rewind(image_file) -> None:
+    try:
+        image_file.seek(0)
+    except Exception:
+        pass
+
+
+def _tesseract(tesseract_cmd: str = ""):
+    import pytesseract
+    if tesseract_cmd:
+        try:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        except Exception:
+            pass
+    return pytesseract
+
+
+def extract_text(image_file, tesseract_cmd: str = "") -> str:
+    """Plain OCR with grayscale, upscale, sharpen and light binarization."""
+    try:
+        from PIL import Image, ImageOps, ImageFilter
+        pytesseract = _tesseract(tesseract_cmd)
+    except Exception:
+        raise OCRError("Please install OCR dependencies: pip install pillow pytesseract. Also install Tesseract OCR engine.")
+    _rewind(image_file)
+    try:
+        image = Image.open(image_file)
+    except Exception as e:
+        raise OCRError(f"Could not open image: {e}")
+    try:
+        # Basic preprocessing: convert to grayscale, upscale, sharpen, binarize
+        img = image.convert("L")
+        # upscale 2x for small text
+        w, h = img.size
+        if max(w, h) < 1600:
+            img = img.resize((w * 2, h * 2))
+        img = ImageOps.autocontrast(img)
+        img = img.filter(ImageFilter.SHARPEN)
+        # light thresholding
+        img = img.point(lambda x: 255 if x > 180 else 0, mode='1')
+
+        config = "--psm 6 -l eng"
+        text = pytesseract.image_to_string(img, config=config)
+        return text or ""
+    except Exception as e:
+        raise OCRError(f"OCR failed: {e}")
+
+
+def extract_text_tsv(image_file, tesseract_cmd: str = "") -> str:
+    """Use Tesseract TSV to preserve row structure and rebuild lines left→right."""
+    try:
+        from PIL import Image, ImageOps
+        import pandas  # noqa: F401  (needed by Output.DATAFRAME)
+        pytesseract = _tesseract(tesseract_cmd)
+    except Exception:
+        raise OCRError("Please install OCR deps: pip install pillow pytesseract pandas")
+    _rewind(image_file)
+    try:
+        image = Image.open(image_file)
+        gray = ImageOps.grayscale(image)
+        config = "--psm 6 -l eng"
+        tsv = pytesseract.image_to_data(gray, config=config, output_type=pytesseract.Output.DATAFRAME)
+        # Clean and group by line
+        df = tsv.dropna(subset=['text']).copy()
+        # Keep more tokens: lower threshold and allow digit-heavy low conf
+        df.loc[:, 'conf'] = df['conf'].astype(float)
+        keep_mask = (df['conf'] >= 25) | df['text'].astype(str).str.contains(r"\d", regex=True)
+        df = df.loc[keep_mask]
+        lines = []
+        for (page, block, par, line), group in df.groupby(['page_num','block_num','par_num','line_num']):
+            tokens = group.sort_values('left')['text'].astype(str).tolist()
+            s = " ".join(tok for tok in tokens if tok.strip())
+            s = " ".join(s.split())
+            if s:
+                lines.append(s)
+        return "\n".join(lines)
+    except Exception as e:
+        raise OCRError(f"OCR TSV failed: {e}")
+
+
+def extract_text_smart(image_file, tesseract_cmd: str = "") -> str:
+    """Table-aware OCR merged with plain OCR to recover missed lines (top/bottom).
+
+    Raises OCRError only when both passes fail.
+    """
+    errors = []
+    texts = []
+    for extract in (extract_text_tsv, extract_text):
+        try:
+            texts.append(extract(image_file, tesseract_cmd))
+        except OCRError as e:
+            errors.append(str(e))
+    if not texts:
+        raise OCRError("; ".join(errors))
+    return "\n".join(t for t in texts if t and t.strip())
@@ -0,0 +1,52 @@
+"""ONNX export of the seq2seq summarizer and generation through ONNX Runtime (CPU).
+
+The export (optimum) writes three graphs: the encoder, the decoder for the
+first step and the decoder that takes past key values, so each later
+decoding step only processes the newest token. The loaded model has the
+same generate() interface as the PyTorch one, so generation.py works with
+either.
+"""
+
+import os
+import shutil
+from typing import Optional
+
+DEFAULT_ONNX_DIR = os.path.join("results", "onnx")
+PROVIDER = "CPUExecutionProvider"
+
+
+def export(model_dir: str, out_dir: str = DEFAULT_ONNX_DIR, base_model: str = "google/flan-t5-small") -> str:
+    """Export the checkpoint in model_dir (with its tokenizer) to out_dir; returns out_dir."""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    except (OSError, ValueError):
+        tokenizer = AutoTokenizer.from_pretrained(base_model)
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_dir, export=True, use_cache=True, provider=PROVIDER)
+    model.save_pretrained(out_dir)
+    tokenizer.save_pretrained(out_dir)
+    # Training settings (task prefixes of a dual model) travel with the exported weights
+    settings = os.path.join(model_dir, "training_settings.json")
+    if os.path.exists(settings):
+        shutil.copy(settings, out_dir)
+    return out_dir
+
+
+def session_options(threads: Optional[int] = None):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    return options
+
+
+def load_onnx_model(onnx_dir: str = DEFAULT_ONNX_DIR, threads: Optional[int] = None):
+    """(tokenizer, model) for an exported directory, running on the ONNX Runtime CPU provider."""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+    model = ORTModelForSeq2SeqLM.from_pretrained(onnx_dir, use_cache=True, provider=PROVIDER,
+                                                 session_options=session_options(threads))
+    return tokenizer, model
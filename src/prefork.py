@@ -0,0 +1,146 @@
+"""Pre-fork serving: warm up once, then fork workers that share the warm heap.
+
+Run with:  python src/prefork.py --workers 4 --port 8000
+
+The parent imports the API and pipeline modules, runs the canned warm-up
+report (compiling every regex and building the reference catalogs), then
+calls gc.freeze() and forks. Workers start serving immediately and share
+those pages copy-on-write with the parent. gc.freeze moves everything
+allocated so far out of the collector's reach, so later collections in a
+worker do not write to (and thereby copy) the shared objects.
+
+Each worker runs its own uvicorn server on the inherited listening socket.
+Its text and OCR pools default to one process each (API_WORKERS and
+API_OCR_WORKERS still override), since the fork count already covers the
+CPUs.
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List
+
+
+def warm(modules: List[str]) -> Dict[str, float]:
+    """Import modules and run the warm-up report; returns per-path ms."""
+    for name in modules:
+        __import__(name)
+    import service
+    return service.warm_up()
+
+
+def freeze() -> None:
+    """Collect garbage, then exclude all surviving objects from future collections."""
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """Rss, Pss and private/shared totals of a process from /proc (Linux), in kB."""
+    out: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[2] == "kB":
+                    out[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        out["Rss"] = int(line.split()[1])
+        except OSError:
+            pass
+    private = out.get("Private_Clean", 0) + out.get("Private_Dirty", 0)
+    shared = out.get("Shared_Clean", 0) + out.get("Shared_Dirty", 0)
+    return {'rss': out.get("Rss", 0), 'pss': out.get("Pss", 0), 'private': private, 'shared': shared}
+
+
+def _listen(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, log_level: str) -> None:
+    import uvicorn
+    from api import app
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="on", log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def serve(host: str, port: int, workers: int, log_level: str = "info") -> int:
+    if not hasattr(os, "fork"):
+        print("Pre-fork mode needs os.fork (Linux/macOS); use uvicorn directly instead.", file=sys.stderr)
+        return 1
+    os.environ.setdefault("API_WORKERS", "1")
+    os.environ.setdefault("API_OCR_WORKERS", "1")
+    sock = _listen(host, port)
+    start = time.perf_counter()
+    timings = warm(["api"])
+    freeze()
+    print(f"[prefork] warmed in {(time.perf_counter() - start) * 1000:.0f} ms {timings}; forking {workers} workers", flush=True)
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(sock, log_level)
+            finally:
+                os._exit(0)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for slot in range(workers):
+        spawn(slot)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            print(f"[prefork] worker {pid} exited ({status}); restarting", flush=True)
+            spawn(slot)
+    sock.close()
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Pre-fork server for the report API.")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args(argv)
+    return serve(args.host, args.port, max(1, args.workers), args.log_level)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
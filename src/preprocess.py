@@ -1,10 +1,51 @@
-# src/preprocess.py
+"""Prepare summarization data: local files in, sharded train/validation/test out.
 
+    python src/preprocess.py --input raw/ more.jsonl --out data/prepared --format jsonl --workers 8
+    python src/preprocess.py --download-meqsum          # old behaviour: MeQSum -> data/{split}.jsonl
+
+Inputs are .jsonl files, .json files (one array of records) or directories
+searched recursively for both. Records in any known shape (MeQSum
+CHQ/Summary, input/target, findings/impression, text/summary) become
+{"input", "target", "patient_target"} (patient_target null when absent);
+others are skipped and counted.
+
+Work is split into tasks (byte ranges of --chunk-mb for .jsonl, whole
+files for .json) run on --workers processes; each task streams its records
+into its own shards of at most --shard-size records, so memory stays
+bounded by the shard size. The split of a record comes from its file name
+(train/val/test) or, failing that, from a hash of its input text, so it is
+stable across runs and worker counts. manifest.json lists sources (with
+hashes), shards (records, bytes, sha256) and per-split totals; train.py
+reads it through paths.manifest. Nothing touches the network.
+"""
+
+import argparse
+import hashlib
 import json
 import os
-from datasets import load_dataset
+import re
+import sys
+import time
+from multiprocessing import Pool
+from typing import Dict, List, Optional
+
+SPLITS = ("train", "validation", "test")
+# (input field, target field) pairs, in order of preference
+RECORD_SHAPES = (("input", "target"), ("CHQ", "Summary"), ("findings", "impression"), ("text", "summary"))
+PATIENT_FIELDS = ("patient_target", "patient_summary")
+# Every shard has exactly these string columns, so shards load together
+COLUMNS = ("input", "target", "patient_target")
+INPUT_EXTENSIONS = (".jsonl", ".json")
+MANIFEST = "manifest.json"
+# Whole file-name tokens that name a split (e.g. "meqsum_val.jsonl", "test-2024.json")
+SPLIT_NAME_TOKENS = {'train': "train", 'val': "validation", 'valid': "validation", 'validation': "validation",
+                     'dev': "validation", 'test': "test"}
+# Yielded by _iter_raw for a .jsonl line that is not valid JSON
+_INVALID = object()
+
 
 def load_meqsum_raw():
+    from datasets import load_dataset
     dataset = load_dataset(
         "json",
         data_files={
@@ -17,12 +58,7 @@ def load_meqsum_raw():
     os.makedirs("data", exist_ok=True)
 
     for split in ["train", "validation", "test"]:
-        records = []
-        for ex in dataset[split]:
-            q = ex.get("CHQ")
-            s = ex.get("Summary")
-            if q and s:
-                records.append({"input": q, "target": s})
+        records = [r for r in (to_record(ex) for ex in dataset[split]) if r]
 
         path = f"data/{split}.jsonl"
         with open(path, "w", encoding="utf-8") as f:
@@ -31,5 +67,265 @@ def load_meqsum_raw():
 
         print(f"Saved {len(records)} examples to {path}")
 
+
+def to_record(ex: dict) -> Optional[dict]:
+    """{"input", "target", "patient_target"} from a raw record (patient_target None when missing),
+    or None if it has no usable pair."""
+    if not isinstance(ex, dict):
+        return None
+    for src, tgt in RECORD_SHAPES:
+        q, s = ex.get(src), ex.get(tgt)
+        if isinstance(q, str) and isinstance(s, str) and q.strip() and s.strip():
+            patient = next((ex[f] for f in PATIENT_FIELDS if isinstance(ex.get(f), str) and ex[f].strip()), None)
+            return {"input": q.strip(), "target": s.strip(), "patient_target": patient.strip() if patient else None}
+    return None
+
+
+def split_from_name(path: str) -> Optional[str]:
+    """Split named by a whole token of the file name (so not "interval", "devices" or "contest")."""
+    name = os.path.splitext(os.path.basename(path))[0].lower()
+    splits = {SPLIT_NAME_TOKENS[t] for t in re.split(r"[^a-z]+", name) if t in SPLIT_NAME_TOKENS}
+    return splits.pop() if len(splits) == 1 else None
+
+
+def split_from_hash(text: str, ratios: tuple) -> str:
+    """Deterministic split for text with the given (train, validation, test) ratios."""
+    point = int(hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest(), 16) / 2 ** 64
+    total = sum(ratios)
+    edge = 0.0
+    for split, ratio in zip(SPLITS, ratios):
+        edge += ratio / total
+        if point < edge:
+            return split
+    return SPLITS[-1]
+
+
+def find_inputs(paths: List[str]) -> List[str]:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, f) for f in files if f.endswith(INPUT_EXTENSIONS))
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            raise FileNotFoundError(path)
+    return sorted(set(found))
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def plan_tasks(files: List[str], chunk_bytes: int) -> List[dict]:
+    """Byte ranges of .jsonl files (cut anywhere; tasks realign to line starts) and whole .json files."""
+    tasks = []
+    for path in files:
+        size = os.path.getsize(path)
+        if path.endswith(".jsonl") and size > chunk_bytes:
+            ranges = [(start, min(size, start + chunk_bytes)) for start in range(0, size, chunk_bytes)]
+        else:
+            ranges = [(0, size)]
+        for start, end in ranges:
+            tasks.append({'task': len(tasks), 'path': path, 'start': start, 'end': end})
+    return tasks
+
+
+def _iter_raw(task: dict):
+    """Raw records of a task: the .jsonl lines that start inside [start, end), or a whole .json file."""
+    path = task['path']
+    if not path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        yield from (data if isinstance(data, list) else [data])
+        return
+    with open(path, "rb") as f:
+        if task['start'] > 0:
+            # A line that started before this range belongs to the previous task
+            f.seek(task['start'] - 1)
+            f.readline()
+        while f.tell() < task['end']:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield _INVALID
+
+
+class ShardWriter:
+    """Writes one task's records per split into shards of at most shard_size records."""
+
+    def __init__(self, out_dir: str, task: int, fmt: str, shard_size: int):
+        self.out_dir, self.task, self.fmt, self.shard_size = out_dir, task, fmt, shard_size
+        self.buffers: Dict[str, list] = {s: [] for s in SPLITS}
+        self.counters = {s: 0 for s in SPLITS}
+        self.shards: List[dict] = []
+
+    def add(self, split: str, record: dict) -> None:
+        buf = self.buffers[split]
+        buf.append(record)
+        if len(buf) >= self.shard_size:
+            self.flush(split)
+
+    def flush(self, split: str) -> None:
+        records = self.buffers[split]
+        if not records:
+            return
+        name = f"{split}-{self.task:05d}-{self.counters[split]:03d}.{self.fmt}"
+        path = os.path.join(self.out_dir, name)
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = pa.schema([(c, pa.string()) for c in COLUMNS])
+            pq.write_table(pa.Table.from_pylist(records, schema=schema), path, compression="zstd")
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                for r in records:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        self.shards.append({'file': name, 'split': split, 'records': len(records),
+                            'bytes': os.path.getsize(path), 'sha256': file_sha256(path)})
+        self.counters[split] += 1
+        self.buffers[split] = []
+
+    def close(self) -> List[dict]:
+        for split in SPLITS:
+            self.flush(split)
+        return self.shards
+
+
+def run_task(args: tuple) -> dict:
+    """Convert one task's records and write its shards (runs in a worker process)."""
+    task, out_dir, fmt, shard_size, split_by, ratios = args
+    writer = ShardWriter(out_dir, task['task'], fmt, shard_size)
+    hint = split_from_name(task['path']) if split_by in ("auto", "name") else None
+    counts = {'read': 0, 'kept': 0, 'invalid_json': 0, 'incomplete': 0}
+    for raw in _iter_raw(task):
+        counts['read'] += 1
+        if raw is _INVALID:
+            counts['invalid_json'] += 1
+            continue
+        record = to_record(raw)
+        if record is None:
+            counts['incomplete'] += 1
+            continue
+        counts['kept'] += 1
+        writer.add(hint or split_from_hash(record["input"], ratios), record)
+    return {'task': task['task'], 'path': task['path'], 'counts': counts, 'shards': writer.close()}
+
+
+def _clear_previous(out_dir: str) -> None:
+    """Remove the shards listed in an earlier manifest, and the manifest itself."""
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path, encoding="utf-8") as f:
+        previous = json.load(f)
+    for shard in previous.get('shards', []):
+        try:
+            os.remove(os.path.join(out_dir, shard['file']))
+        except FileNotFoundError:
+            pass
+    os.remove(path)
+
+
+def prepare(inputs: List[str], out_dir: str, fmt: str = "jsonl", shard_size: int = 50000, workers: int = 0,
+            chunk_mb: float = 64.0, split_by: str = "auto", ratios: tuple = (0.9, 0.05, 0.05),
+            overwrite: bool = False) -> dict:
+    """Convert inputs into shards under out_dir and write the manifest; returns the manifest."""
+    if fmt == "parquet":
+        import pyarrow  # noqa: F401  (fail before starting workers)
+    started = time.time()
+    files = find_inputs(inputs)
+    if not files:
+        raise ValueError(f"No {'/'.join(INPUT_EXTENSIONS)} files in {inputs}")
+    os.makedirs(out_dir, exist_ok=True)
+    if os.path.exists(os.path.join(out_dir, MANIFEST)):
+        if not overwrite:
+            raise FileExistsError(f"{out_dir} already holds a prepared dataset; pass --overwrite to replace it.")
+        _clear_previous(out_dir)
+
+    tasks = plan_tasks(files, max(1, int(chunk_mb * 1024 * 1024)))
+    workers = workers or os.cpu_count() or 1
+    jobs = [(t, out_dir, fmt, shard_size, split_by, ratios) for t in tasks]
+    if workers == 1 or len(tasks) == 1:
+        results = [run_task(j) for j in jobs]
+    else:
+        with Pool(min(workers, len(tasks))) as pool:
+            results = list(pool.imap_unordered(run_task, jobs))
+    results.sort(key=lambda r: r['task'])
+
+    shards = [s for r in results for s in r['shards']]
+    counts = {k: sum(r['counts'][k] for r in results) for k in ('read', 'kept', 'invalid_json', 'incomplete')}
+    splits = {s: {'records': sum(x['records'] for x in shards if x['split'] == s),
+                  'files': [x['file'] for x in shards if x['split'] == s]} for s in SPLITS}
+    manifest = {
+        'created': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        'format': fmt,
+        'shard_size': shard_size,
+        'split_by': split_by,
+        'ratios': list(ratios),
+        'schema': list(COLUMNS),
+        'sources': [{'path': p, 'bytes': os.path.getsize(p), 'sha256': file_sha256(p)} for p in files],
+        'counts': counts,
+        'splits': splits,
+        'shards': shards,
+        'workers': min(workers, len(tasks)),
+        'seconds': round(time.time() - started, 2),
+    }
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+def manifest_files(manifest_path: str) -> Dict[str, List[str]]:
+    """{split: shard paths} from a manifest written by prepare()."""
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    base = os.path.dirname(manifest_path)
+    return {split: [os.path.join(base, name) for name in info['files']] for split, info in manifest['splits'].items()}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Prepare sharded summarization data from local files.")
+    ap.add_argument("--input", nargs="+", help="files or directories (.jsonl, .json)")
+    ap.add_argument("--out", default=os.path.join("data", "prepared"))
+    ap.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    ap.add_argument("--shard-size", type=int, default=50000, help="records per shard")
+    ap.add_argument("--workers", type=int, default=0, help="default: one per CPU")
+    ap.add_argument("--chunk-mb", type=float, default=64.0, help=".jsonl bytes per task")
+    ap.add_argument("--split-by", choices=("auto", "name", "hash"), default="auto",
+                    help="auto: file name if it says train/val/test, else hash of the input text")
+    ap.add_argument("--ratios", type=float, nargs=3, default=(0.9, 0.05, 0.05), metavar=("TRAIN", "VAL", "TEST"))
+    ap.add_argument("--overwrite", action="store_true")
+    ap.add_argument("--download-meqsum", action="store_true", help="fetch MeQSum into data/{split}.jsonl (needs network)")
+    args = ap.parse_args(argv)
+
+    if args.download_meqsum:
+        load_meqsum_raw()
+        return 0
+    if not args.input:
+        ap.error("--input is required (or use --download-meqsum)")
+    try:
+        manifest = prepare(args.input, args.out, args.format, args.shard_size, args.workers, args.chunk_mb,
+                           args.split_by, tuple(args.ratios), args.overwrite)
+    except (FileExistsError, FileNotFoundError, ValueError, ImportError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    c = manifest['counts']
+    print(f"{c['kept']} of {c['read']} records kept ({c['incomplete']} incomplete, {c['invalid_json']} invalid JSON) "
+          f"from {len(manifest['sources'])} files in {manifest['seconds']}s on {manifest['workers']} workers")
+    for split, info in manifest['splits'].items():
+        print(f"  {split:<10} {info['records']:>9} records in {len(info['files'])} shards")
+    print(f"Manifest: {os.path.join(args.out, MANIFEST)}")
+    return 0
+
+
 if __name__ == "__main__":
-    load_meqsum_raw()
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""Hybrid report summarization: rules for lab tables, a model only for narrative prose.
+
+route_report() splits a report into lab lines (anything parse_lab_table
+or a freeform lab detector understands), section headers and narrative
+sentences. hybrid_summarize()
+sends the whole text through the rule-based lab pipeline, hands only the
+narrative to a narrative summarizer (the seq2seq model, or the keyword rules
+when no model is loaded) and merges both into the doctor and patient
+summaries. Its 'routing' entry reports how many tokens skipped the model.
+"""
+
+import json
+import re
+import urllib.request
+from typing import Callable, Dict, List, Optional
+
+from findings import summarize_findings
+from lab_pipeline import FREEFORM_DETECTORS, analyze_lab_text, clean_lab_line, parse_lab_line
+from timing import NULL_TIMER
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+# Statuses that are not worth mentioning in a summary
+QUIET_STATUSES = ('normal', 'info', 'not tested')
+
+NarrativeFn = Callable[[str], Dict[str, str]]
+
+
+class NarrativeError(RuntimeError):
+    """The narrative model failed or its model server could not be reached."""
+
+
+def _is_header(line: str) -> bool:
+    """Section titles such as 'URINE EXAMINATION' (all caps, no digits, short)."""
+    return line.isupper() and not any(ch.isdigit() for ch in line) and len(line.split()) <= 6
+
+
+def _detected(line: str) -> bool:
+    """True when a freeform lab detector turns the line into rows (e.g. 'SGPT (ALT) 88 U/L')."""
+    return any(detect(line) for _, detect in FREEFORM_DETECTORS)
+
+
+def route_report(text: str) -> dict:
+    """Split text into {'lab_lines', 'header_lines', 'narrative'} (narrative as sentences).
+
+    Lab lines still reach the rules through analyze_lab_text on the full
+    text; only the narrative goes to the model.
+    """
+    lab_lines: List[str] = []
+    header_lines: List[str] = []
+    prose: List[str] = []
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        cleaned = clean_lab_line(line)
+        range_row, std_row, extra = parse_lab_line(cleaned)
+        if range_row or std_row or extra or _detected(cleaned):
+            lab_lines.append(line)
+        elif _is_header(line):
+            header_lines.append(line)
+        else:
+            prose.append(line)
+    narrative = [s.strip() for s in _SENTENCE_SPLIT.split(" ".join(prose)) if s.strip()]
+    return {'lab_lines': lab_lines, 'header_lines': header_lines, 'narrative': narrative}
+
+
+def rules_narrative(text: str) -> Dict[str, str]:
+    """Narrative summarizer from the keyword rules (used when no model is loaded)."""
+    pos, neg, pos_h, neg_h = summarize_findings(text)
+    doctor = "; ".join(pos + neg)
+    patient = "; ".join(pos_h + neg_h)
+    return {'doctor': doctor, 'patient': patient}
+
+
+def model_narrative(model, tokenizer, dual: bool = False, max_new_tokens: Optional[Dict[str, int]] = None,
+                    **generate_kwargs) -> NarrativeFn:
+    """Narrative summarizer backed by a seq2seq model.
+
+    A single-output model writes one summary, used for both audiences. With
+    dual=True (a model trained with doctor/patient task prefixes) both
+    summaries are decoded from one encoder pass (generation.generate_dual),
+    within the per-task max_new_tokens budgets {'doctor': n, 'patient': m}.
+    """
+    from generation import generate_dual, generate_summaries
+    if dual and not max_new_tokens:
+        raise ValueError("dual=True needs max_new_tokens per task, e.g. {'doctor': 128, 'patient': 110}.")
+
+    def generate(text: str) -> Dict[str, str]:
+        if dual:
+            out = generate_dual(model, tokenizer, [text], max_new_tokens=max_new_tokens, **generate_kwargs)
+            return {'doctor': out['doctor'][0], 'patient': out['patient'][0]}
+        summary = generate_summaries(model, tokenizer, [text], **generate_kwargs)[0]
+        return {'doctor': summary, 'patient': summary}
+
+    def summarize(text: str) -> Dict[str, str]:
+        try:
+            return generate(text)
+        except Exception as e:
+            raise NarrativeError(f"Narrative model failed: {type(e).__name__}: {e}") from e
+
+    return summarize
+
+
+def remote_narrative(url: str, timeout: float = 30.0) -> NarrativeFn:
+    """Narrative summarizer that calls a model server's POST /generate (model_server.py).
+
+    A dual server (MODEL_DUAL=1 there) answers with both summaries; otherwise
+    its one summary is used for both audiences.
+    """
+    endpoint = url.rstrip("/") + "/generate"
+
+    def summarize(text: str) -> Dict[str, str]:
+        req = urllib.request.Request(endpoint, data=json.dumps({'text': text}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                reply = json.loads(resp.read())
+            if 'doctor' in reply:
+                return {'doctor': reply['doctor'], 'patient': reply['patient']}
+            return {'doctor': reply['summary'], 'patient': reply['summary']}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # URLError, HTTPError and timeouts are OSErrors; a malformed reply is ValueError/KeyError/TypeError
+            raise NarrativeError(f"Model server {url} failed: {type(e).__name__}: {e}") from e
+
+    return summarize
+
+
+def remote_model_info(url: str, timeout: float = 5.0) -> dict:
+    """A model server's GET /health: its checkpoint, quantization, dual flag and decoding budgets."""
+    try:
+        with urllib.request.urlopen(url.rstrip("/") + "/health", timeout=timeout) as resp:
+            info = json.loads(resp.read())
+        if not isinstance(info, dict):
+            raise ValueError(f"expected an object, got {type(info).__name__}")
+        return info
+    except (OSError, ValueError) as e:
+        raise NarrativeError(f"Model server {url} failed: {type(e).__name__}: {e}") from e
+
+
+def lab_highlights(rows: list) -> List[str]:
+    """'Test: value unit (direction; ref low-high)' for each out-of-range row."""
+    out = []
+    for r in rows:
+        if r['Status'] in QUIET_STATUSES:
+            continue
+        direction = {'borderline_high': 'slightly high', 'borderline_low': 'slightly low'}.get(r['Status'], r['Status'])
+        low, high = r['Ref Low'], r['Ref High']
+        ref = f"{low}-{high}" if (low and high) else (f"<{high}" if high else (f">{low}" if low else ''))
+        ref = f"; ref {ref}" if ref else ''
+        out.append(f"{r['Test']}: {r['Value']} {r['Unit']}".rstrip() + f" ({direction}{ref})")
+    return out
+
+
+def patient_lab_sentence(rows: list) -> str:
+    flagged = [r for r in rows if r['Status'] not in QUIET_STATUSES]
+    if not flagged:
+        return "Your test results are within the normal range." if rows else ""
+    parts = []
+    for r in flagged:
+        word = {'high': 'high', 'low': 'low', 'borderline_high': 'slightly high',
+                'borderline_low': 'slightly low'}.get(r['Status'], 'outside the normal range')
+        parts.append(f"{r['Test']} is {word}")
+    return "Some results need attention: " + ", ".join(parts) + "."
+
+
+def hybrid_summarize(text: str, narrative_fn: Optional[NarrativeFn] = None,
+                     count_tokens: Optional[Callable[[str], int]] = None, timer=NULL_TIMER) -> dict:
+    """Doctor and patient summaries of one report, plus the lab rows and routing stats.
+
+    narrative_fn maps the narrative text to {'doctor', 'patient'} (default
+    rules_narrative); count_tokens defaults to whitespace words, pass the
+    model tokenizer's length for model-token fractions.
+    """
+    narrative_fn = narrative_fn or rules_narrative
+    count_tokens = count_tokens or (lambda s: len(s.split()))
+    with timer.span('route'):
+        routed = route_report(text)
+    rows = analyze_lab_text(text, timer)
+    narrative_text = " ".join(routed['narrative'])
+    narrative = {'doctor': '', 'patient': ''}
+    if narrative_text:
+        with timer.span('narrative'):
+            narrative = narrative_fn(narrative_text)
+
+    highlights = lab_highlights(rows)
+    doctor_parts = []
+    if highlights:
+        doctor_parts.append("Abnormal labs: " + "; ".join(highlights) + ".")
+    if narrative['doctor']:
+        doctor_parts.append(narrative['doctor'])
+    patient_parts = [p for p in (patient_lab_sentence(rows), narrative['patient']) if p]
+
+    model_tokens = count_tokens(narrative_text) if narrative_text else 0
+    total_tokens = model_tokens + sum(count_tokens(ln) for ln in routed['lab_lines'] + routed['header_lines'])
+    return {
+        'doctor_summary': " ".join(doctor_parts),
+        'patient_summary': " ".join(patient_parts),
+        'rows': rows,
+        'routing': {
+            'lab_lines': len(routed['lab_lines']),
+            'header_lines': len(routed['header_lines']),
+            'narrative_sentences': len(routed['narrative']),
+            'tokens_total': total_tokens,
+            'tokens_to_model': model_tokens,
+            'skipped_fraction': round(1 - model_tokens / total_tokens, 4) if total_tokens else 0.0,
+        },
+    }
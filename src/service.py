@@ -0,0 +1,199 @@
+"""Report analysis jobs for the HTTP service.
+
+Plain top-level functions that take and return picklable values, so the API
+can run them in a process pool without blocking its event loop.
+"""
+
+import hashlib
+import io
+import json
+import os
+
+from findings import summarize_findings
+from lab_pipeline import STANDARD_REFS, analyze_lab_text
+from ocr import extract_text_smart
+from router import NarrativeError, hybrid_summarize, model_narrative, remote_model_info, remote_narrative
+from timing import NULL_TIMER, StageTimer
+
+# Bump when pipeline code changes its output; cached results and ETags follow it
+ENGINE_VERSION = "1"
+# Reference-range catalog fingerprint, so editing STANDARD_REFS invalidates results too
+CATALOG_VERSION = hashlib.sha256(repr(sorted(STANDARD_REFS.items())).encode("utf-8")).hexdigest()[:12]
+# Narrative model for hybrid_job: a micro-batching model server (model_server.py),
+# else a checkpoint loaded in each worker; neither set = keyword rules only
+MODEL_SERVER_URL = os.environ.get("MODEL_SERVER_URL", "")
+MODEL_DIR = os.environ.get("MODEL_DIR", "")
+# MODEL_DIR was trained with doctor/patient task prefixes: decode both from one encoder pass
+MODEL_DUAL = os.environ.get("MODEL_DUAL", "0") == "1"
+# Dual decoding budgets in new tokens; keep them in line with doc_target_max_len /
+# patient_target_max_len from the training config
+GEN_DOCTOR_MAX_NEW_TOKENS = int(os.environ.get("GEN_DOCTOR_MAX_NEW_TOKENS", "128"))
+GEN_PATIENT_MAX_NEW_TOKENS = int(os.environ.get("GEN_PATIENT_MAX_NEW_TOKENS", "110"))
+
+
+# Ops whose result depends on the narrative model (and so whose ETag includes it)
+MODEL_OPS = ('hybrid',)
+
+
+def check_model_settings() -> None:
+    """Reject settings that cannot work together; called where the narrative model is set up."""
+    if MODEL_SERVER_URL and MODEL_DUAL:
+        # The model server decides how it decodes; a local flag would only change the ETag
+        raise RuntimeError("MODEL_DUAL applies to a local MODEL_DIR; with MODEL_SERVER_URL set MODEL_DUAL=1 "
+                           "on the model server instead.")
+
+
+# Canned report touching table rows, each freeform detector and the findings rules
+WARMUP_REPORT = """Hemoglobin 10.5 g/dl 12-15
+Total WBC 12000 /mm3 4000-10000
+Sodium 126 mmol/L 135-146
+BNP 590 pg/ml <100
+SGPT (ALT) 88 U/L
+Total Bilirubin 1.8 mg/dl 0.3-1.2
+URINE EXAMINATION
+Appearance Slightly Turbid
+Albumin PRESENT(++)
+Pus cells 20-25 /hpf
+Specific Gravity Q.N.S.
+Mild cardiomegaly. No pleural effusion. Hemoglobin is low. Blood sugar is high."""
+
+
+def normalize_report_text(text: str) -> str:
+    """Canonical form of a report: LF line endings, no trailing spaces or blank edges.
+
+    The pipeline gives the same result for a text and its canonical form, so
+    requests are computed (and keyed) on the canonical text.
+    """
+    lines = [ln.rstrip() for ln in text.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def request_key(op: str, payload) -> str:
+    """Key identifying identical work: op plus the hash of the text or image bytes."""
+    data = payload.encode("utf-8") if isinstance(payload, str) else payload
+    return f"{op}:{hashlib.sha256(data).hexdigest()}"
+
+
+_server_tag = ""
+
+
+def model_tag() -> str:
+    """Identity of the narrative model setup, for ETags.
+
+    With MODEL_SERVER_URL it is the URL plus the server's /health settings
+    (dual output, budgets, checkpoint), fetched once per process; raises
+    NarrativeError while the server cannot be reached.
+    """
+    global _server_tag
+    if MODEL_SERVER_URL:
+        if not _server_tag:
+            info = {k: v for k, v in remote_model_info(MODEL_SERVER_URL).items() if k != 'status'}
+            _server_tag = f"{MODEL_SERVER_URL}|{json.dumps(info, sort_keys=True)}"
+        return _server_tag
+    if MODEL_DUAL:
+        return f"{MODEL_DIR}|dual|{GEN_DOCTOR_MAX_NEW_TOKENS}|{GEN_PATIENT_MAX_NEW_TOKENS}"
+    return MODEL_DIR
+
+
+def result_etag(key: str) -> str:
+    """Strong ETag for the result of request_key(): input hash plus engine/catalog version,
+    and the model for MODEL_OPS.
+
+    Results are deterministic for a given input and version, so the ETag is
+    known before (and without) computing the result.
+    """
+    model = model_tag() if key.split(":", 1)[0] in MODEL_OPS else ""
+    tag = hashlib.sha256(f"{key}|{ENGINE_VERSION}|{CATALOG_VERSION}|{model}".encode("utf-8")).hexdigest()[:32]
+    return f'"{tag}"'
+
+
+def labs_job(text: str, timer=NULL_TIMER) -> dict:
+    """Parsed lab rows for a report text."""
+    return {'rows': analyze_lab_text(text, timer)}
+
+
+def summarize_job(text: str, timer=NULL_TIMER) -> dict:
+    """Doctor and patient findings plus the parsed lab rows."""
+    with timer.span('summarize'):
+        pos, neg, pos_h, neg_h = summarize_findings(text)
+    return {
+        'findings': pos,
+        'normal_findings': neg,
+        'patient_findings': pos_h,
+        'patient_normal_findings': neg_h,
+        'rows': analyze_lab_text(text, timer),
+    }
+
+
+_narrative = None
+
+
+def _narrative_model() -> tuple:
+    """(narrative_fn, count_tokens) for hybrid_job, loaded once per process."""
+    global _narrative
+    if _narrative is None:
+        check_model_settings()
+        if MODEL_SERVER_URL:
+            _narrative = (remote_narrative(MODEL_SERVER_URL), None)
+        elif MODEL_DIR:
+            try:
+                from generation import load_model
+                tokenizer, model = load_model(MODEL_DIR)
+            except Exception as e:
+                raise NarrativeError(f"Could not load MODEL_DIR {MODEL_DIR}: {type(e).__name__}: {e}") from e
+            budgets = {'doctor': GEN_DOCTOR_MAX_NEW_TOKENS, 'patient': GEN_PATIENT_MAX_NEW_TOKENS}
+            narrative_fn = model_narrative(model, tokenizer, dual=MODEL_DUAL, max_new_tokens=budgets if MODEL_DUAL else None)
+            _narrative = (narrative_fn, lambda s: len(tokenizer(s)["input_ids"]))
+        else:
+            _narrative = (None, None)
+    return _narrative
+
+
+def hybrid_job(text: str, timer=NULL_TIMER) -> dict:
+    """Doctor/patient summaries: lab lines through the rules, narrative through the model (router.py).
+
+    Raises NarrativeError when the model or model server fails.
+    """
+    narrative_fn, count_tokens = _narrative_model()
+    return hybrid_summarize(text, narrative_fn, count_tokens, timer)
+
+
+def ocr_job(data: bytes, tesseract_cmd: str = "", timer=NULL_TIMER) -> dict:
+    """Smart (table-aware + plain) OCR of an image, then lab parsing.
+
+    Raises OCRError when OCR cannot run.
+    """
+    with timer.span('ocr'):
+        text = extract_text_smart(io.BytesIO(data), tesseract_cmd)
+    return {'text': text, 'rows': analyze_lab_text(text, timer) if text.strip() else []}
+
+
+def run_timed(job, *args) -> tuple:
+    """Run job(*args) with a StageTimer; returns (result, spans, counts).
+
+    Used in pool workers, so stage timings and detector counts travel back
+    to the API process with the result.
+    """
+    timer = StageTimer()
+    result = job(*args, timer=timer)
+    return result, timer.spans, timer.counts
+
+
+def warm_up() -> dict:
+    """Run the canned report through every text path; returns per-path ms.
+
+    Populates the re module's pattern cache and any lazily built tables, so
+    the first real request does not pay for them.
+    """
+    timings = {}
+    text = normalize_report_text(WARMUP_REPORT)
+
+    def hybrid_rules(t, timer):
+        # Rule narrative: warming must not load MODEL_DIR (or torch)
+        return hybrid_summarize(t, timer=timer)
+
+    for name, job in (('labs', labs_job), ('summarize', summarize_job), ('hybrid', hybrid_rules)):
+        timer = StageTimer()
+        job(text, timer=timer)
+        timings[name] = round(timer.total_ms(), 2)
+    return timings
@@ -0,0 +1,272 @@
+"""Bounded per-session memory for the Streamlit app.
+
+Large payloads (uploaded images, OCR text) are spooled to a content-addressed
+temp directory and referenced by hash, so session_state only holds small
+references. Each session gets a SessionMemory with a byte budget: in-memory
+values beyond the budget are spilled to the spool, least recently used
+first. Spooled reports are private: the spool and each session's
+subdirectory are owner-only, and a session's files are removed when its
+SessionMemory is closed or garbage-collected. Subdirectories untouched for
+SPOOL_STALE_HOURS (left by a process that was killed) are swept when a
+SpoolStore is created. SESSIONS tracks every live SessionMemory for the
+per-session memory metric; entries disappear with their session (weak
+references).
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Optional, Union
+
+SPOOL_DIR = os.environ.get("SPOOL_DIR", os.path.join(tempfile.gettempdir(), "medical-report-spool"))
+SPOOL_MAX_BYTES = int(float(os.environ.get("SPOOL_MAX_MB", "512")) * 1024 * 1024)
+# Session subdirectories with nothing written or read for this long are removed at startup
+SPOOL_STALE_HOURS = float(os.environ.get("SPOOL_STALE_HOURS", "24"))
+SESSION_BUDGET_BYTES = int(float(os.environ.get("SESSION_MEMORY_BUDGET_MB", "8")) * 1024 * 1024)
+# Values at least this large skip memory and go straight to the spool
+INLINE_MAX_BYTES = 64 * 1024
+THUMBNAIL_MAX_SIDE = 480
+
+Payload = Union[bytes, str]
+
+
+class SpoolStore:
+    """Content-addressed files on local disk, pruned oldest-first past max_bytes.
+
+    Files live in one owner-only subdirectory per owner (a session), so
+    drop(owner) removes everything a session spooled.
+    """
+
+    def __init__(self, root: str = SPOOL_DIR, max_bytes: int = SPOOL_MAX_BYTES,
+                 stale_after_s: float = SPOOL_STALE_HOURS * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, mode=0o700, exist_ok=True)
+        os.chmod(root, 0o700)
+        self.sweep(stale_after_s)
+
+    def _path(self, key: str, owner: str = "") -> str:
+        return os.path.join(self.root, owner, key)
+
+    def put(self, data: bytes, owner: str = "") -> str:
+        key = hashlib.sha256(data).hexdigest()
+        path = self._path(key, owner)
+        try:
+            os.utime(path)
+            return key
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._prune()
+        return key
+
+    def get(self, key: str, owner: str = "") -> Optional[bytes]:
+        """Payload for key, or None if it was pruned."""
+        path = self._path(key, owner)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Pruned after the read; the data is still good
+            pass
+        return data
+
+    def drop(self, owner: str) -> None:
+        """Remove every file spooled for owner."""
+        if owner:
+            shutil.rmtree(os.path.join(self.root, owner), ignore_errors=True)
+
+    def sweep(self, max_age_s: float) -> int:
+        """Remove owner subdirectories whose newest file is older than max_age_s; returns how many."""
+        cutoff = time.time() - max_age_s
+        removed = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                newest = max([entry.stat().st_mtime] + [f.stat().st_mtime for f in os.scandir(entry.path)])
+            except FileNotFoundError:
+                continue
+            if newest < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def _prune(self) -> None:
+        with self._lock:
+            entries = []
+            total = 0
+            for dirpath, _, names in os.walk(self.root):
+                for name in names:
+                    if name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+class SessionMemory:
+    """Named payloads for one session, kept under a byte budget.
+
+    Values live in memory until the budget is exceeded; then the least
+    recently used ones are spilled to the spool and reloaded on demand.
+    Spilled values go to a spool subdirectory of this object alone, removed
+    by close() or when the object is garbage-collected with its session.
+    """
+
+    def __init__(self, spool: SpoolStore, budget_bytes: int = SESSION_BUDGET_BYTES):
+        self.spool = spool
+        self.budget_bytes = budget_bytes
+        self.owner = uuid.uuid4().hex
+        self._finalizer = weakref.finalize(self, spool.drop, self.owner)
+        # name -> [value or None, size, spool key or None, is_text]
+        self._items: "OrderedDict[str, list]" = OrderedDict()
+        # Sizes of values held elsewhere (e.g. widget state): counted, never spilled
+        self._tracked: dict = {}
+        self.inline_bytes = 0
+        self.spilled = 0
+        self.last_seen = time.time()
+
+    def put(self, name: str, value: Payload) -> str:
+        """Store value under name; returns its content hash."""
+        self.discard(name)
+        is_text = isinstance(value, str)
+        data = value.encode("utf-8") if is_text else value
+        if len(data) >= INLINE_MAX_BYTES:
+            key = self.spool.put(data, self.owner)
+            self._items[name] = [None, len(data), key, is_text]
+        else:
+            key = hashlib.sha256(data).hexdigest()
+            self._items[name] = [value, len(data), None, is_text]
+            self.inline_bytes += len(data)
+            self._enforce_budget()
+        self.last_seen = time.time()
+        return key
+
+    @property
+    def resident_bytes(self) -> int:
+        return self.inline_bytes + sum(self._tracked.values())
+
+    def track(self, name: str, size: int) -> None:
+        """Account for a value this session keeps outside the store."""
+        self._tracked[name] = size
+        self.last_seen = time.time()
+        self._enforce_budget()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._items
+
+    def get(self, name: str) -> Optional[Payload]:
+        item = self._items.get(name)
+        self.last_seen = time.time()
+        if item is None:
+            return None
+        self._items.move_to_end(name)
+        value, _, key, is_text = item
+        if value is not None:
+            return value
+        data = self.spool.get(key, self.owner)
+        if data is None:
+            self.discard(name)
+            return None
+        return data.decode("utf-8") if is_text else data
+
+    def close(self) -> None:
+        """Forget every value and delete this session's spooled files."""
+        self._items.clear()
+        self._tracked.clear()
+        self.inline_bytes = 0
+        self._finalizer()
+
+    def discard(self, name: str) -> None:
+        item = self._items.pop(name, None)
+        if item is not None and item[0] is not None:
+            self.inline_bytes -= item[1]
+
+    def _enforce_budget(self) -> None:
+        for name, item in list(self._items.items()):
+            if self.resident_bytes <= self.budget_bytes:
+                break
+            value, size, _, is_text = item
+            if value is None:
+                continue
+            item[2] = self.spool.put(value.encode("utf-8") if is_text else value, self.owner)
+            item[0] = None
+            self.inline_bytes -= size
+            self.spilled += 1
+
+
+class SessionRegistry:
+    """Weak registry of live SessionMemory objects for the memory metric."""
+
+    def __init__(self):
+        self._sessions: "weakref.WeakValueDictionary[str, SessionMemory]" = weakref.WeakValueDictionary()
+
+    def register(self, session_id: str, memory: SessionMemory) -> None:
+        self._sessions[session_id] = memory
+
+    def close_all(self) -> None:
+        """Close every live session (at process exit, so no spool files are left behind)."""
+        for memory in list(self._sessions.values()):
+            memory.close()
+
+    def stats(self, active_within_s: float = 1800.0) -> dict:
+        now = time.time()
+        sizes = [m.resident_bytes for m in list(self._sessions.values()) if now - m.last_seen <= active_within_s]
+        total = sum(sizes)
+        return {
+            "active_sessions": len(sizes),
+            "total_bytes": total,
+            "avg_bytes_per_session": total / len(sizes) if sizes else 0.0,
+            "max_bytes_per_session": max(sizes, default=0),
+        }
+
+
+SESSIONS = SessionRegistry()
+
+
+def make_thumbnail(data: bytes, max_side: int = THUMBNAIL_MAX_SIDE) -> Optional[bytes]:
+    """Downsampled JPEG preview of an image, or None if Pillow cannot read it."""
+    try:
+        from PIL import Image
+    except Exception:
+        return None
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.thumbnail((max_side, max_side))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=80)
+        return out.getvalue()
+    except Exception:
+        return None
@@ -0,0 +1,52 @@
+"""Coalescing of identical concurrent requests (singleflight).
+
+The first caller for a key starts the computation; callers arriving with the
+same key while it is still running await the same result instead of
+computing it again. Nothing is cached once the computation finishes.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Per-key in-flight deduplication for asyncio code."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        """Result of fn(), shared with every concurrent caller using key.
+
+        The computation runs as its own task, so a caller that is cancelled
+        (e.g. its client disconnected) does not cancel it for the others.
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every caller went away
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> dict:
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'coalesce_rate': self.coalesced / self.calls if self.calls else 0.0,
+            'in_flight': self.in_flight,
+        }
@@ -0,0 +1,134 @@
+"""Lightweight per-stage timing for the report pipeline.
+
+A StageTimer records the spans of one request (for a waterfall view) and
+any event counts the pipeline reports along the way;
+StageStats keeps a rolling window of durations per stage across requests
+and reports p50/p95. Both use time.perf_counter and only cost a few
+microseconds per span.
+"""
+
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+
+
+class StageTimer:
+    """Spans recorded during one request, as (stage, start_ms, duration_ms)."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[tuple] = []
+        self.counts: Dict[str, int] = {}
+        self._open: Dict[str, float] = {}
+
+    def begin(self, stage: str) -> None:
+        self._open[stage] = time.perf_counter()
+
+    def end(self, stage: str) -> float:
+        """Close a span opened with begin(); returns its duration in ms."""
+        start = self._open.pop(stage, None)
+        if start is None:
+            return 0.0
+        duration = (time.perf_counter() - start) * 1000.0
+        self.spans.append((stage, (start - self.origin) * 1000.0, duration))
+        return duration
+
+    @contextmanager
+    def span(self, stage: str):
+        self.begin(stage)
+        try:
+            yield
+        finally:
+            self.end(stage)
+
+    def count(self, event: str, n: int = 1) -> None:
+        self.counts[event] = self.counts.get(event, 0) + n
+
+    def total_ms(self) -> float:
+        return max((start + dur for _, start, dur in self.spans), default=0.0)
+
+    def as_rows(self) -> List[dict]:
+        return [
+            {'Stage': stage, 'Start (ms)': round(start, 2), 'Duration (ms)': round(dur, 2)}
+            for stage, start, dur in self.spans
+        ]
+
+
+class _NullTimer:
+    """Drop-in for StageTimer when nobody is measuring."""
+
+    spans: List[tuple] = []
+    counts: Dict[str, int] = {}
+
+    def begin(self, stage: str) -> None:
+        pass
+
+    def count(self, event: str, n: int = 1) -> None:
+        pass
+
+    def end(self, stage: str) -> float:
+        return 0.0
+
+    @contextmanager
+    def span(self, stage: str):
+        yield
+
+
+NULL_TIMER = _NullTimer()
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+class StageStats:
+    """Rolling per-stage latency window (last `window` samples per stage)."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self.samples: Dict[str, Deque[float]] = {}
+
+    def add(self, stage: str, duration_ms: float) -> None:
+        self.samples.setdefault(stage, deque(maxlen=self.window)).append(duration_ms)
+
+    def record(self, timer: StageTimer) -> None:
+        for stage, _, duration in timer.spans:
+            self.add(stage, duration)
+
+    def summary(self, stage: str) -> Optional[dict]:
+        values = sorted(self.samples.get(stage, ()))
+        if not values:
+            return None
+        return {
+            'Stage': stage,
+            'Count': len(values),
+            'p50 (ms)': round(_percentile(values, 0.50), 2),
+            'p95 (ms)': round(_percentile(values, 0.95), 2),
+            'Max (ms)': round(values[-1], 2),
+        }
+
+    def as_rows(self) -> List[dict]:
+        return [row for row in (self.summary(s) for s in self.samples) if row]
+
+
+def waterfall_html(timer: StageTimer) -> str:
+    """Waterfall of one request's spans as plain HTML bars (no chart deps)."""
+    total = timer.total_ms() or 1.0
+    rows = []
+    for stage, start, dur in timer.spans:
+        left = 100.0 * start / total
+        width = max(0.5, 100.0 * dur / total)
+        rows.append(
+            "<div style='display:flex;align-items:center;gap:8px;font-size:12px;margin:2px 0'>"
+            f"<div style='width:170px;color:#9aa3b2'>{stage}</div>"
+            "<div style='flex:1;position:relative;height:10px;background:#12151b;border-radius:4px'>"
+            f"<div style='position:absolute;left:{left:.2f}%;width:{width:.2f}%;height:10px;background:#3b82f6;border-radius:4px'></div>"
+            "</div>"
+            f"<div style='width:80px;text-align:right;color:#e9eef7'>{dur:.1f} ms</div>"
+            "</div>"
+        )
+    return "".join(rows)
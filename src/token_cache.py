@@ -0,0 +1,96 @@
+"""On-disk cache of tokenized datasets.
+
+Tokenized DatasetDicts are saved in Arrow format under
+<cache_dir>/<fingerprint>/, where the fingerprint covers the content hash
+of every source file, the tokenizer (name, class, vocabulary, special
+tokens, transformers version) and the tokenization settings (max lengths,
+columns). Any change to those gives a new entry; reloads go through
+datasets.load_from_disk, which memory-maps the Arrow files instead of
+reading them into memory.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Callable, Dict, List, Union
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "tokenized")
+# Bump when the layout of cached datasets or the tokenization code changes
+CACHE_VERSION = "3"
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer) -> Dict[str, str]:
+    import transformers
+    vocab = json.dumps(sorted(tokenizer.get_vocab().items()), ensure_ascii=False)
+    return {
+        'name': str(getattr(tokenizer, "name_or_path", "")),
+        'class': type(tokenizer).__name__,
+        'transformers': transformers.__version__,
+        'vocab': hashlib.sha256(vocab.encode("utf-8")).hexdigest(),
+        'special_tokens': json.dumps(tokenizer.special_tokens_map, sort_keys=True, default=str),
+        'padding_side': str(getattr(tokenizer, "padding_side", "")),
+    }
+
+
+def dataset_fingerprint(files: Dict[str, Union[str, List[str]]], tokenizer, **settings) -> str:
+    """Hex key for the tokenized form of files (split -> path or list of shards) under tokenizer and settings."""
+    key = {
+        'version': CACHE_VERSION,
+        'files': {split: [file_sha256(p) for p in ([paths] if isinstance(paths, str) else paths)]
+                  for split, paths in sorted(files.items())},
+        'tokenizer': tokenizer_fingerprint(tokenizer),
+        'settings': settings,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:24]
+
+
+def load_or_build(cache_dir: str, fingerprint: str, build: Callable[[], object], meta: dict = None):
+    """The cached dataset for fingerprint, building and saving it with build() on a miss.
+
+    An empty cache_dir disables caching. Entries are written to a temporary
+    directory first and renamed into place, so a crashed or concurrent run
+    never leaves a half-written entry behind.
+    """
+    from datasets import load_from_disk
+    if not cache_dir:
+        return build()
+    path = os.path.join(cache_dir, fingerprint)
+    if os.path.isdir(path):
+        print(f"Loading tokenized dataset from {path}")
+        return load_from_disk(path)
+
+    dataset = build()
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{fingerprint}-", dir=cache_dir)
+    try:
+        dataset.save_to_disk(tmp)
+        with open(os.path.join(tmp, "cache_meta.json"), "w", encoding="utf-8") as f:
+            json.dump(dict(meta or {}, fingerprint=fingerprint), f, indent=2, default=str)
+        os.replace(tmp, path)
+    except OSError:
+        # Another run saved the same entry first
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+    print(f"Saved tokenized dataset to {path}")
+    # Reload so the result is memory-mapped from the cache like a hit would be
+    return load_from_disk(path)
+
+
+def read_meta(cache_dir: str, fingerprint: str) -> dict:
+    """The meta saved with a cache entry by load_or_build ({} if there is none)."""
+    path = os.path.join(cache_dir, fingerprint, "cache_meta.json") if cache_dir else ""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
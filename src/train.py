@@ -1,59 +1,231 @@
+"""Fine-tune a seq2seq summarizer from a YAML config.
+
+    python src/train.py --config configs/config.yaml
+
+Examples are tokenized without padding; DataCollatorForSeq2Seq pads each
+batch to its longest example (labels with -100, so padding is not scored).
+With length_bucketing in the config, training batches group examples of
+similar input length (the Trainer's public group_by_length option, reading
+the "length" column written at tokenization).
+
+When some records also have a patient summary, each of those reports gives two
+examples whose labels start with a task prefix ("doctor: ...",
+"patient: ..."), so one encoder pass can serve both summaries at inference
+(generation.generate_dual). Whether it did is saved with the checkpoint in
+training_settings.json, which evaluate.py reads to decode the same way.
+"""
+
+import argparse
+import dataclasses
 import json
 import os
+from typing import Optional
+
+import yaml
 from datasets import load_dataset
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, Seq2SeqTrainer, Seq2SeqTrainingArguments, DataCollatorForSeq2Seq
-
-# Paths to the processed JSONL files
-train_file = "data/train.jsonl"
-# Prefer validation split if available; fallback to test
-val_file = "data/validation.jsonl" if os.path.exists("data/validation.jsonl") else "data/test.jsonl"
-
-# Load dataset
-dataset = load_dataset("json", data_files={"train": train_file, "validation": val_file})
-
-# Model and tokenizer
-model_name = "google/flan-t5-small"   # You can upgrade to flan-t5-base or bart-large
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-
-# Tokenization
-def preprocess_function(batch):
-    inputs = tokenizer(batch["input"], max_length=512, truncation=True, padding="max_length")
-    targets = tokenizer(batch["target"], max_length=128, truncation=True, padding="max_length")
-    inputs["labels"] = targets["input_ids"]
-    return inputs
-
-tokenized_dataset = dataset.map(preprocess_function, batched=True, remove_columns=dataset["train"].column_names)
-
-# Model
-model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-
-# Data collator
-data_collator = DataCollatorForSeq2Seq(tokenizer, model=model)
-
-# Training arguments
-training_args = Seq2SeqTrainingArguments(
-    output_dir="./results",
-    evaluation_strategy="epoch",
-    learning_rate=5e-5,
-    per_device_train_batch_size=8,
-    per_device_eval_batch_size=8,
-    weight_decay=0.01,
-    save_total_limit=2,
-    num_train_epochs=3,
-    predict_with_generate=True,
-    logging_dir="./logs",
-    logging_steps=50,
-)
-
-# Trainer
-trainer = Seq2SeqTrainer(
-    model=model,
-    args=training_args,
-    train_dataset=tokenized_dataset["train"],
-    eval_dataset=tokenized_dataset["validation"],
-    tokenizer=tokenizer,
-    data_collator=data_collator,
-)
-
-# Train
-trainer.train()
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, Seq2SeqTrainer, Seq2SeqTrainingArguments, DataCollatorForSeq2Seq, set_seed
+
+from generation import TASK_PREFIXES, TRAINING_SETTINGS
+from preprocess import manifest_files
+from token_cache import DEFAULT_CACHE_DIR, dataset_fingerprint, load_or_build, read_meta
+
+DEFAULT_CONFIG = "configs/config.yaml"
+# Source/target column names, in order of preference (MeQSum uses input/target, reports use findings/impression)
+INPUT_COLUMNS = ("input", "findings", "text")
+TARGET_COLUMNS = ("target", "impression", "summary")
+# Optional patient-friendly target; enables dual (doctor + patient) training
+PATIENT_COLUMNS = ("patient_target", "patient_summary")
+# Per-example input length, read by group_by_length (length_bucketing)
+LENGTH_COLUMN = "length"
+# Training arguments YAML may give as strings (PyYAML reads 5e-5 as a string)
+FLOAT_ARGS = ("learning_rate", "weight_decay", "warmup_ratio", "max_grad_norm", "adam_epsilon")
+
+
+def load_config(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def data_files(cfg: dict) -> dict:
+    """train/validation data from cfg['paths'], falling back to the test split for validation.
+
+    With paths.manifest (written by preprocess.py) each split is its list of shards.
+    """
+    paths = cfg.get("paths", {})
+    if paths.get("manifest"):
+        shards = manifest_files(paths["manifest"])
+        return {"train": shards["train"], "validation": shards["validation"] or shards["test"]}
+    train_file = paths.get("train_file", "data/train.jsonl")
+    val_file = paths.get("val_file", "data/validation.jsonl")
+    if not os.path.exists(val_file):
+        val_file = paths.get("test_file", "data/test.jsonl")
+    return {"train": train_file, "validation": val_file}
+
+
+def data_format(files: dict) -> str:
+    """load_dataset builder for files: "parquet" for Parquet shards, else "json"."""
+    paths = [p for v in files.values() for p in ([v] if isinstance(v, str) else v)]
+    return "parquet" if paths and all(p.endswith(".parquet") for p in paths) else "json"
+
+
+def pick_columns(column_names) -> tuple:
+    src = next((c for c in INPUT_COLUMNS if c in column_names), None)
+    tgt = next((c for c in TARGET_COLUMNS if c in column_names), None)
+    if src is None or tgt is None:
+        raise ValueError(f"Need one of {INPUT_COLUMNS} and one of {TARGET_COLUMNS}; got {list(column_names)}")
+    return src, tgt
+
+
+def patient_column(train_split) -> Optional[str]:
+    """The patient target column of a raw train split, if any record has one (dual training).
+
+    Prepared shards always carry patient_target, null when a record has none.
+    """
+    return next((c for c in PATIENT_COLUMNS if c in train_split.column_names
+                 and any(isinstance(t, str) and t.strip() for t in train_split[c])), None)
+
+
+def tokenize_dataset(dataset, tokenizer, cfg: dict):
+    """Tokenize every split with truncation only; padding is left to the collator."""
+    src_col, tgt_col = pick_columns(dataset["train"].column_names)
+    max_input = cfg.get("max_input_length", 512)
+    max_target = cfg.get("max_target_length", 128)
+
+    patient_col = patient_column(dataset["train"])
+
+    def preprocess(batch):
+        inputs = tokenizer(batch[src_col], max_length=max_input, truncation=True)
+        targets = tokenizer(text_target=batch[tgt_col], max_length=max_target, truncation=True)
+        inputs["labels"] = targets["input_ids"]
+        inputs[LENGTH_COLUMN] = [len(ids) for ids in inputs["input_ids"]]
+        return inputs
+
+    def preprocess_dual(batch):
+        # Doctor and patient summaries with their task prefix, sharing the input. Records with a
+        # null patient_target give the doctor example only.
+        inputs = tokenizer(batch[src_col], max_length=max_input, truncation=True)
+        doctor = tokenizer(text_target=[f"{TASK_PREFIXES['doctor']} {t}" for t in batch[tgt_col]],
+                           max_length=cfg.get("doc_target_max_len", max_target), truncation=True)
+        has_patient = [i for i, t in enumerate(batch[patient_col]) if isinstance(t, str) and t.strip()]
+        patient = tokenizer(text_target=[f"{TASK_PREFIXES['patient']} {batch[patient_col][i].strip()}" for i in has_patient],
+                            max_length=cfg.get("patient_target_max_len", max_target), truncation=True)
+        patient_labels = dict(zip(has_patient, patient["input_ids"]))
+        out = {key: [] for key in list(inputs.keys()) + ["labels"]}
+        for i in range(len(batch[src_col])):
+            for labels in (doctor["input_ids"][i], patient_labels.get(i)):
+                if labels is None:
+                    continue
+                for key in inputs.keys():
+                    out[key].append(inputs[key][i])
+                out["labels"].append(labels)
+        out[LENGTH_COLUMN] = [len(ids) for ids in out["input_ids"]]
+        return out
+
+    fn = preprocess_dual if patient_col else preprocess
+    return dataset.map(fn, batched=True, remove_columns=dataset["train"].column_names)
+
+
+def cached_tokenized_dataset(cfg: dict, tokenizer) -> tuple:
+    """(tokenize_dataset() of the configured files through the on-disk cache (paths.tokenized_cache),
+    whether it holds dual doctor/patient examples)."""
+    files = data_files(cfg)
+    settings = {
+        'kind': "train",
+        'max_input_length': cfg.get("max_input_length", 512),
+        'max_target_length': cfg.get("max_target_length", 128),
+        'input_columns': INPUT_COLUMNS,
+        'target_columns': TARGET_COLUMNS,
+        'patient_columns': PATIENT_COLUMNS,
+        'task_prefixes': TASK_PREFIXES,
+        'doc_target_max_len': cfg.get("doc_target_max_len"),
+        'patient_target_max_len': cfg.get("patient_target_max_len"),
+        'length_column': LENGTH_COLUMN,
+    }
+    cache_dir = cfg.get("paths", {}).get("tokenized_cache", DEFAULT_CACHE_DIR)
+    fingerprint = dataset_fingerprint(files, tokenizer, **settings) if cache_dir else ""
+
+    meta = dict(settings, files=files)
+
+    def build():
+        raw = load_dataset(data_format(files), data_files=files)
+        meta['dual'] = patient_column(raw["train"]) is not None  # saved with the entry
+        return tokenize_dataset(raw, tokenizer, cfg)
+
+    dataset = load_or_build(cache_dir, fingerprint, build, meta=meta)
+    if 'dual' not in meta:
+        meta = read_meta(cache_dir, fingerprint)
+    return dataset, bool(meta.get('dual'))
+
+
+def save_training_settings(output_dir: str, cfg: dict, dual: bool) -> None:
+    """What evaluation needs to decode the checkpoint the way it was trained (generation.training_settings)."""
+    settings = {
+        'base_model': cfg.get("base_model", "google/flan-t5-small"),
+        'max_input_length': cfg.get("max_input_length", 512),
+        'max_target_length': cfg.get("max_target_length", 128),
+        'task_prefixes': TASK_PREFIXES if dual else None,
+        'doc_target_max_len': cfg.get("doc_target_max_len"),
+        'patient_target_max_len': cfg.get("patient_target_max_len"),
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, TRAINING_SETTINGS), "w", encoding="utf-8") as f:
+        json.dump(settings, f, indent=2)
+
+
+def training_arguments(cfg: dict) -> Seq2SeqTrainingArguments:
+    """Seq2SeqTrainingArguments from cfg['train'] (unknown keys are reported and skipped)."""
+    train_cfg = dict(cfg.get("train", {}))
+    fields = {f.name for f in dataclasses.fields(Seq2SeqTrainingArguments)}
+    # Renamed to eval_strategy in newer transformers
+    if "evaluation_strategy" in train_cfg and "evaluation_strategy" not in fields:
+        train_cfg["eval_strategy"] = train_cfg.pop("evaluation_strategy")
+    for key in FLOAT_ARGS:
+        if key in train_cfg:
+            train_cfg[key] = float(train_cfg[key])
+    unknown = sorted(k for k in train_cfg if k not in fields)
+    for key in unknown:
+        print(f"Ignoring unknown train option: {key}")
+        train_cfg.pop(key)
+    if cfg.get("length_bucketing", False):
+        train_cfg.setdefault("group_by_length", True)
+        train_cfg.setdefault("length_column_name", LENGTH_COLUMN)
+    train_cfg.setdefault("output_dir", "./results")
+    train_cfg.setdefault("seed", cfg.get("seed", 42))
+    return Seq2SeqTrainingArguments(**train_cfg)
+
+
+def data_collator(tokenizer, model, training_args):
+    # Multiples of 8 keep tensor shapes friendly for mixed-precision kernels
+    mixed = training_args.fp16 or training_args.bf16
+    return DataCollatorForSeq2Seq(tokenizer, model=model, label_pad_token_id=-100, pad_to_multiple_of=8 if mixed else None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fine-tune a seq2seq summarizer.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    args = parser.parse_args(argv)
+
+    cfg = load_config(args.config)
+    set_seed(cfg.get("seed", 42))
+    training_args = training_arguments(cfg)
+
+    model_name = cfg.get("base_model", "google/flan-t5-small")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenized_dataset, dual = cached_tokenized_dataset(cfg, tokenizer)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+
+    trainer = Seq2SeqTrainer(
+        model=model,
+        args=training_args,
+        train_dataset=tokenized_dataset["train"],
+        eval_dataset=tokenized_dataset["validation"],
+        tokenizer=tokenizer,
+        data_collator=data_collator(tokenizer, model, training_args),
+    )
+    trainer.train()
+    trainer.save_model()
+    save_training_settings(training_args.output_dir, cfg, dual)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 import random
-import numpy as np
-import torch
 
 def set_seed(seed: int = 42):
+    # numpy/torch are imported here so format_patient_summary stays cheap to import
+    import numpy as np
+    import torch
     random.seed(seed)
     np.random.seed(seed)
     torch.manual_seed(seed)
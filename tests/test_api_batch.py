@@ -0,0 +1,25 @@
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+import api  # noqa: E402
+
+
+def test_batch_returns_one_line_per_input():
+    items = [{'id': f"r{i}", 'text': f"Hemoglobin {10 + i}.5 g/dl 12-15\nNo pleural effusion.", 'op': op}
+             for i, op in enumerate(['summarize', 'labs', 'summarize', 'labs', 'summarize'])]
+    body = "\n".join(json.dumps(item) for item in items) + "\nnot json\n"
+    with TestClient(api.app) as client:
+        response = client.post("/batch", content=body, headers={'Content-Type': "application/x-ndjson"})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+    assert len(lines) == len(items) + 1
+    by_index = {line['index']: line for line in lines}
+    assert sorted(by_index) == list(range(len(items) + 1))
+    for i, item in enumerate(items):
+        assert by_index[i]['ok'] and by_index[i]['id'] == item['id']
+    assert by_index[len(items)]['ok'] is False
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+import api  # noqa: E402
+
+REPORT = {'text': "Hemoglobin 10.5 g/dl 12-15\nSodium 126 mmol/L 135-146"}
+
+
+def test_results_are_polled_with_conditional_get():
+    with TestClient(api.app) as client:
+        first = client.post("/labs", json=REPORT)
+        assert first.status_code == 200
+        etag, location = first.headers['ETag'], first.headers['Content-Location']
+        assert location.startswith("/results/labs/")
+
+        stored = client.get(location)
+        assert stored.status_code == 200 and stored.json() == first.json()
+        assert stored.headers['ETag'] == etag
+        assert client.get(location, headers={'If-None-Match': etag}).status_code == 304
+
+        # RFC 9110 13.1.2: a matching If-None-Match on POST is a failed precondition, not a 304
+        assert client.post("/labs", json=REPORT, headers={'If-None-Match': etag}).status_code == 412
+
+
+def test_unknown_results_are_not_found():
+    with TestClient(api.app) as client:
+        assert client.get("/results/labs/" + "0" * 64).status_code == 404
+        assert client.get("/results/batch/" + "0" * 64).status_code == 404
+        assert client.get("/results/labs/not-a-digest").status_code == 404
@@ -0,0 +1,18 @@
+import os
+
+from check_import_time import TARGETS, check
+
+BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "150"))
+
+
+def _describe(result: dict) -> str:
+    if result['error']:
+        return f"{result['module']}: import failed ({result['error']})"
+    return f"{result['module']}: {result['ms']:.1f} ms, heavy imports {result['heavy'] or '-'}"
+
+
+def test_modules_import_within_budget_without_heavy_dependencies():
+    results = check(BUDGET_MS, repeat=3)
+    assert len(results) == len(TARGETS)
+    failures = [r for r in results if not r['ok']]
+    assert not failures, "\n".join(_describe(r) for r in failures)
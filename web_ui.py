@@ -5,11 +5,22 @@ Modern, accessible, and user-friendly interface using Streamlit
 """
 
 import streamlit as st
+import os
 import re
+import sys
+import uuid
 from datetime import datetime
 import json
 from typing import List, Tuple, Dict, Optional
 
+# Pipeline modules import each other as siblings of src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from history_store import SHARED_HISTORY, HistoryStore  # noqa: E402
+
+# Version of the summarizers below, part of every history key: bump it when
+# comprehensive_summarize or patient_friendly_summary change what they return
+HISTORY_VERSION = "1"
+
 # Page configuration with better defaults
 st.set_page_config(
     page_title="Medical Report Summarizer",
@@ -310,8 +321,6 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session state for better user experience
-if 'analysis_history' not in st.session_state:
-    st.session_state.analysis_history = []
 if 'user_preferences' not in st.session_state:
     st.session_state.user_preferences = {
         'show_technical': True,
@@ -520,20 +529,50 @@ def validate_input(text: str) -> Tuple[bool, str]:
     
     return True, ""
 
-def save_analysis_history(report_text: str, positive_findings: List[str], negative_findings: List[str]):
-    """Save analysis to session history."""
+@st.cache_resource
+def get_history_store() -> HistoryStore:
+    """Persistent history store (SQLite) used by all sessions; entries are scoped by history_owner()."""
+    return HistoryStore(version=HISTORY_VERSION)
+
+def history_owner() -> str:
+    """Owner of this session's history entries, or "" when ANALYSIS_HISTORY_SHARED=1."""
+    if SHARED_HISTORY:
+        return ""
+    if 'history_owner' not in st.session_state:
+        st.session_state.history_owner = uuid.uuid4().hex
+    return st.session_state.history_owner
+
+def save_analysis_history(report_text: str, positive_findings: List[str], negative_findings: List[str],
+                          patient_positive: List[str], patient_negative: List[str]):
+    """Save analysis to the persistent history store."""
     if st.session_state.user_preferences['save_history']:
-        analysis = {
-            'timestamp': datetime.now().isoformat(),
-            'report_preview': report_text[:100] + "..." if len(report_text) > 100 else report_text,
-            'positive_findings': positive_findings,
-            'negative_findings': negative_findings
-        }
-        st.session_state.analysis_history.append(analysis)
-        
-        # Keep only last 10 analyses
-        if len(st.session_state.analysis_history) > 10:
-            st.session_state.analysis_history = st.session_state.analysis_history[-10:]
+        get_history_store().save(
+            report_text,
+            {
+                'positive_findings': positive_findings,
+                'negative_findings': negative_findings,
+                'patient_positive': patient_positive,
+                'patient_negative': patient_negative,
+            },
+            names=positive_findings + [f[3:] if f.startswith("no ") else f for f in negative_findings],
+            source='web_ui',
+            owner=history_owner(),
+        )
+
+def open_history_entry(text_hash: str):
+    """Load a past report back into the editor; analyzing it again is a history lookup."""
+    entry = get_history_store().entry(text_hash, 'web_ui', history_owner())
+    if entry:
+        st.session_state.report_input = entry['report_text']
+
+def render_history_entry(item: dict, title: str):
+    with st.expander(title):
+        results = get_history_store().load(item['text_hash'], 'web_ui', history_owner()) or {}
+        st.write(f"**Preview:** {item['preview']}")
+        st.write(f"**Time:** {datetime.fromtimestamp(item['created_at']).isoformat()[:19]}")
+        if results.get('positive_findings'):
+            st.write(f"**Findings:** {', '.join(results['positive_findings'][:3])}")
+        st.button("Open", key=f"open_{title}_{item['text_hash']}", on_click=open_history_entry, args=(item['text_hash'],))
 
 def main():
     """Main application function with enhanced UI/UX."""
@@ -608,15 +647,19 @@ def main():
         - **Bowel & Lymph** - obstructions, enlarged nodes
         """)
         
-        # Analysis history
-        if st.session_state.analysis_history:
+        # Analysis history (persistent, newest first)
+        recent = get_history_store().recent(5, source='web_ui', owner=history_owner())
+        if recent:
             st.markdown("### 📚 Recent Analyses")
-            for i, analysis in enumerate(reversed(st.session_state.analysis_history[-5:])):
-                with st.expander(f"Analysis {len(st.session_state.analysis_history) - i}"):
-                    st.write(f"**Preview:** {analysis['report_preview']}")
-                    st.write(f"**Time:** {analysis['timestamp'][:19]}")
-                    if analysis['positive_findings']:
-                        st.write(f"**Findings:** {', '.join(analysis['positive_findings'][:3])}")
+            for item in recent:
+                render_history_entry(item, datetime.fromtimestamp(item['created_at']).strftime('%Y-%m-%d %H:%M:%S'))
+            query = st.text_input("Search history by finding", placeholder="e.g. cardiomegaly")
+            if query.strip():
+                matches = get_history_store().search(query, source='web_ui', owner=history_owner())
+                if not matches:
+                    st.caption("No past analyses mention that finding.")
+                for item in matches:
+                    render_history_entry(item, f"🔎 {item['preview'][:40]}")
     
     # Main content area with better layout
     col1, col2 = st.columns([2, 1])
@@ -730,12 +773,20 @@ def analyze_report(report_text: str):
     
     # Show loading state
     with st.spinner("🔬 Analyzing your medical report..."):
-        # Process the report
-        positive_findings, negative_findings = comprehensive_summarize(report_text)
-        patient_positive, patient_negative = patient_friendly_summary(positive_findings, negative_findings)
-        
-        # Save to history
-        save_analysis_history(report_text, positive_findings, negative_findings)
+        # Reuse a stored analysis of the same text instead of recomputing
+        cached = get_history_store().get(report_text, 'web_ui', history_owner())
+        if cached:
+            positive_findings = cached['positive_findings']
+            negative_findings = cached['negative_findings']
+            patient_positive = cached['patient_positive']
+            patient_negative = cached['patient_negative']
+        else:
+            # Process the report
+            positive_findings, negative_findings = comprehensive_summarize(report_text)
+            patient_positive, patient_negative = patient_friendly_summary(positive_findings, negative_findings)
+            
+            # Save to history
+            save_analysis_history(report_text, positive_findings, negative_findings, patient_positive, patient_negative)
         
         # Display results with enhanced styling
         st.markdown("---")